@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+from start_points import make_dataset
+
+from zlmfit.fit_data import BOOTSTRAP_MODES, FitData, Wave
+
+
+def main():
+    rng = np.random.default_rng(0)
+    fit_data = FitData(
+        make_dataset(3000, rng), make_dataset(6000, rng), make_dataset(1, rng)
+    )
+    fit_data.bins = 2
+    fit_data.lower = 1.0
+    fit_data.upper = 2.0
+    fit_data.niters = 8
+    fit_data.set_waves(
+        [Wave(0, 0, 1), Wave(1, 1, 1), Wave(2, 0, 1)], 0, [Wave(1, 0, -1)], 0
+    )
+    fit_data.bin_datasets()
+    fit_results = fit_data.run_fit()
+    fit_data.bootstrap = True
+    fit_data.nboot = 100
+    spreads = {}
+    times = {}
+    for mode in BOOTSTRAP_MODES:
+        fit_data.bootstrap_mode = mode
+        start = time.perf_counter()
+        results = fit_data.run_bootstrap(fit_results)
+        times[mode] = time.perf_counter() - start
+        spreads[mode] = {}
+        for ibin, statuses in results.items():
+            x = np.array([status.x for status in statuses])
+            yields = fit_data.yields(ibin, x, acceptance_corrected=False)
+            spreads[mode][ibin] = (
+                np.std(yields.total, ddof=1),
+                np.std(yields.per_wave, axis=0, ddof=1),
+            )
+    waves = [str(wave) for wave in fit_data.waves()]
+    print(f'{fit_data.nboot} bootstraps in each of {fit_data.bins} bins')
+    print(
+        f'{"mode":>12} {"bin":>4} {"σ(total)":>9} ' + ' '.join(f'{w:>9}' for w in waves)
+    )
+    for mode in BOOTSTRAP_MODES:
+        for ibin, (total, per_wave) in spreads[mode].items():
+            print(
+                f'{mode:>12} {ibin:>4} {total:9.2f} '
+                + ' '.join(f'{value:9.2f}' for value in per_wave)
+            )
+    print(' '.join(f'{mode}: {times[mode]:.2f}s' for mode in BOOTSTRAP_MODES))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import laddu as ld
+import numpy as np
+from start_points import make_dataset
+
+from zlmfit.fit_data import FitData, Wave, sample_bin
+
+
+class TimeLimit(ld.MCMCObserver):
+    def __init__(self, seconds: float):
+        self.deadline = time.perf_counter() + seconds
+
+    def callback(self, step: int, ensemble: ld.Ensemble) -> tuple[ld.Ensemble, bool]:
+        return ensemble, time.perf_counter() > self.deadline
+
+
+def summary(chain: np.ndarray, skip: int, elapsed: float) -> str:
+    """
+    Steps, milliseconds per step, and the integrated autocorrelation time after
+    ``skip`` steps of a (walkers, steps, parameters) chain.
+    """
+    steps = chain.shape[1]
+    if steps - skip < 200:
+        tau = '-'
+    else:
+        tau = f'{np.mean(ld.integrated_autocorrelation_times(chain[:, skip:])):.1f}'
+    return f'{steps:6d} {1e3 * elapsed / steps:8.0f} {tau:>6}'
+
+
+def main():
+    rng = np.random.default_rng(0)
+    fit_data = FitData(
+        make_dataset(3000, rng), make_dataset(6000, rng), make_dataset(1, rng)
+    )
+    fit_data.bins = 2
+    fit_data.lower = 1.0
+    fit_data.upper = 2.0
+    fit_data.niters = 8
+    fit_data.set_waves(
+        [Wave(0, 0, 1), Wave(1, 1, 1), Wave(2, 0, 1)], 0, [Wave(1, 0, -1)], 0
+    )
+    fit_data.bin_datasets()
+    fit_results = fit_data.run_fit()
+    fit_data.mcmc = True
+    fit_data.nwalkers = 16
+    fit_data.sigma = 0.1
+    fit_data.ntau = 10
+    fit_data.dtau = 0.0  # never converge, so every chain runs to max_steps
+    fit_data.max_steps = 1500
+    settings = replace(fit_data.sampler_settings(), verbose=False)
+    skip = fit_data.max_steps // 3
+    budget = 120.0
+    print(
+        f'{fit_data.max_steps} steps of {fit_data.nwalkers} walkers (laddu adaptive:'
+        f' at most {budget:.0f}s), τ after step {skip}'
+    )
+    print(f'{"bin":>4} {"sampler":>24} {"steps":>6} {"ms/step":>8} {"τ":>6}')
+    with tempfile.TemporaryDirectory() as directory:
+        for ibin, fit_result in fit_results.items():
+            p0, _ = fit_data.walker_starts(ibin, fit_result)
+            for segment_steps in (fit_data.max_steps, fit_data.segment_steps):
+                task = (
+                    ibin,
+                    p0,
+                    fit_data.waves(),
+                    fit_data.parameters(),
+                    replace(settings, segment_steps=segment_steps),
+                    Path(directory) / f'{ibin}_{segment_steps}',
+                )
+                start = time.perf_counter()
+                with fit_data.task_pool() as pool:
+                    [(_, chain)] = pool.map(sample_bin, [task])
+                elapsed = time.perf_counter() - start
+                name = f'segments of {segment_steps}'
+                print(
+                    f'{ibin:>4} {name:>24} '
+                    + summary(chain.load().transpose(1, 0, 2), skip, elapsed)
+                )
+            # laddu's default, which adapts the step scale over the first 100 steps
+            start = time.perf_counter()
+            ensemble = fit_data.get_nll(ibin).mcmc(
+                p0,
+                fit_data.max_steps,
+                observers=[TimeLimit(budget)],
+                seed=int(np.random.default_rng((0, ibin, 0)).integers(2**31)),
+            )
+            elapsed = time.perf_counter() - start
+            print(
+                f'{ibin:>4} {"laddu adaptive, one call":>24} '
+                + summary(ensemble.get_chain(), skip, elapsed)
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import timeit
+
+from zlmfit.fit_data import Wave
+
+POS_WAVES = [Wave(0, 0, 1), Wave(1, 1, 1), Wave(1, 0, 1), Wave(2, 0, 1), Wave(2, 2, 1)]
+NEG_WAVES = [Wave(0, 0, -1), Wave(1, -1, -1), Wave(2, 1, -1)]
+
+
+def main():
+    number = 200
+    build = timeit.timeit(
+        lambda: Wave.build_model(POS_WAVES, 0, NEG_WAVES, 0), number=number
+    )
+    Wave.clear_model_cache()
+    cached = timeit.timeit(
+        lambda: Wave.get_model(POS_WAVES, 0, NEG_WAVES, 0), number=number
+    )
+    print(f'uncached: {build / number * 1e6:10.2f} µs/call')
+    print(f'cached:   {cached / number * 1e6:10.2f} µs/call')
+
+
+if __name__ == '__main__':
+    main()
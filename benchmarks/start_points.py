@@ -0,0 +1,110 @@
+import time
+
+import laddu as ld
+import numpy as np
+
+from zlmfit.fit_data import FitData, Wave
+from zlmfit.starts import START_METHODS, sobol_available
+
+
+def make_dataset(n: int, rng: np.random.Generator) -> ld.Dataset:
+    # beam, recoil, and two pions with a flat angular distribution
+    events = []
+    for _ in range(n):
+        mass = rng.uniform(1.0, 2.0)
+        cos_theta = rng.uniform(-1.0, 1.0)
+        phi = rng.uniform(-np.pi, np.pi)
+        sin_theta = np.sqrt(1.0 - cos_theta**2)
+        p = np.sqrt(max(mass**2 / 4 - 0.14**2, 1e-6))
+        e = np.sqrt(p**2 + 0.14**2)
+        pz = rng.uniform(3.0, 7.0)
+        direction = p * np.array(
+            [sin_theta * np.cos(phi), sin_theta * np.sin(phi), cos_theta]
+        )
+        resonance = ld.Vector4.from_array(
+            np.array([0.0, 0.0, pz, np.sqrt(pz**2 + mass**2)])
+        )
+        pol_angle = rng.uniform(0.0, 2 * np.pi)
+        events.append(
+            ld.Event(
+                [
+                    ld.Vector4.from_array(np.array([0.0, 0.0, 8.5, 8.5])),
+                    ld.Vector4.from_array(
+                        np.array([0.1, 0.2, -0.5, np.sqrt(0.938**2 + 0.3)])
+                    ),
+                    ld.Vector4.from_array(np.array([*direction, e])).boost(
+                        resonance.beta
+                    ),
+                    ld.Vector4.from_array(np.array([*(-direction), e])).boost(
+                        resonance.beta
+                    ),
+                ],
+                [
+                    ld.Vector3.from_array(
+                        np.array([0.3 * np.cos(pol_angle), 0.3 * np.sin(pol_angle), 0.0])
+                    )
+                ],
+                float(rng.uniform(0.5, 1.5)),
+            )
+        )
+    return ld.Dataset(events)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    fit_data = FitData(
+        make_dataset(2000, rng), make_dataset(6000, rng), make_dataset(1, rng)
+    )
+    fit_data.bins = 4
+    fit_data.lower = 1.0
+    fit_data.upper = 2.0
+    fit_data.set_waves(
+        [Wave(0, 0, 1), Wave(1, 1, 1), Wave(2, 0, 1)], 0, [Wave(1, 0, -1)], 0
+    )
+    fit_data.bin_datasets()
+    nstarts = 16
+    methods = [
+        method for method in START_METHODS if method != 'sobol' or sobol_available()
+    ]
+    results = {}
+    times = {}
+    for scale in (False, True):
+        for method in methods:
+            fit_data.start_method = method
+            fit_data.scale_starts = scale
+            start = time.perf_counter()
+            results[method, scale] = [
+                [
+                    fit_data.get_nll(ibin).minimize(x0)
+                    for x0 in fit_data.start_points(ibin, nstarts)
+                ]
+                for ibin in range(fit_data.bins)
+            ]
+            times[method, scale] = time.perf_counter() - start
+    best = [
+        min(status.fx for statuses in results.values() for status in statuses[ibin])
+        for ibin in range(fit_data.bins)
+    ]
+    print(f'{nstarts} starts in each of {fit_data.bins} bins')
+    print(
+        f'{"method":>8} {"scaled":>6} {"f evals":>8} {"g evals":>8} {"at best":>8} {"to best":>8} {"time":>7}'
+    )
+    for (method, scale), statuses in results.items():
+        flat = [status for bin_statuses in statuses for status in bin_statuses]
+        hits = [
+            [status.fx - best[ibin] < 1e-3 for status in statuses[ibin]]
+            for ibin in range(fit_data.bins)
+        ]
+        to_best = [hit.index(True) + 1 if any(hit) else np.nan for hit in hits]
+        print(
+            f'{method:>8} {str(scale):>6}'
+            f' {np.mean([status.n_f_evals for status in flat]):8.1f}'
+            f' {np.mean([status.n_g_evals for status in flat]):8.1f}'
+            f' {np.mean([hit for bin_hits in hits for hit in bin_hits]):8.1%}'
+            f' {np.nanmean(to_best):8.1f}'
+            f' {times[method, scale]:6.2f}s'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from start_points import make_dataset
+
+from zlmfit.chains import convergence_summary
+from zlmfit.fit_data import FitData, Wave
+
+
+def main():
+    rng = np.random.default_rng(0)
+    fit_data = FitData(
+        make_dataset(3000, rng), make_dataset(6000, rng), make_dataset(1, rng)
+    )
+    fit_data.bins = 2
+    fit_data.lower = 1.0
+    fit_data.upper = 2.0
+    fit_data.niters = 8
+    fit_data.workers = 2
+    fit_data.set_waves(
+        [Wave(0, 0, 1), Wave(1, 1, 1), Wave(2, 0, 1)], 0, [Wave(1, 0, -1)], 0
+    )
+    fit_data.bin_datasets()
+    fit_results = fit_data.run_fit()
+    fit_data.bootstrap = True
+    fit_data.nboot = 50
+    fit_data.bootstrap_mode = 'multinomial'
+    bootstrap_results = fit_data.run_bootstrap(fit_results)
+    fit_data.mcmc = True
+    fit_data.nwalkers = 16
+    fit_data.sigma = 0.1
+    fit_data.ntau = 10
+    fit_data.dtau = 0.1
+    fit_data.max_steps = 500
+    strategies = {
+        'ball': ('ball', None),
+        'covariance': ('covariance', None),
+        'bootstrap': ('covariance', bootstrap_results),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (walker_init, bootstraps) in strategies.items():
+            fit_data.walker_init = walker_init
+            fit_data.output_path = Path(directory) / f'{name}.zlmfit'
+            start = time.perf_counter()
+            chains = fit_data.run_mcmc(fit_results, bootstrap_results=bootstraps)
+            elapsed = time.perf_counter() - start
+            print(
+                f'{name:>10}: '
+                + ' '.join(f'{chain.steps:5d}' for chain in chains.values())
+            )
+            for line in convergence_summary(list(chains.values())).values():
+                print(f'{"":>12}{line} ({elapsed:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+import copy
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import laddu as ld
+import numpy as np
+
+if TYPE_CHECKING:
+    from zlmfit.fit_data import Wave
+
+
+def zlm_values(waves: Sequence['Wave'], dataset: ld.Dataset) -> np.ndarray:
+    """
+    Evaluates Zlm(angles, polarization) for every wave on every event, returning a
+    complex array with shape (events, waves).
+    """
+    angles = ld.Angles(0, [1], [2], [2, 3])
+    polarization = ld.Polarization(0, [1])
+    manager = ld.Manager()
+    expression = 0
+    for wave in waves:
+        expression += manager.register(
+            ld.Zlm(
+                f'Z{wave}',
+                l=wave.l,  # type: ignore
+                m=wave.m,  # type: ignore
+                r='+' if wave.r > 0 else '-',
+                angles=angles,
+                polarization=polarization,
+            )
+        )
+    evaluator = manager.model(expression).load(dataset)  # type: ignore
+    values = np.empty((len(dataset), len(waves)), dtype=np.complex128)
+    for i, wave in enumerate(waves):
+        evaluator.isolate(f'Z{wave}')
+        values[:, i] = evaluator.evaluate([])
+    return values
+
+
+class AmplitudeCache:
+    """
+    Least-recently-used cache of per-event Zlm values, holding at most ``max_bytes``
+    of arrays. The most recently used entry is always kept, even if it is larger.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, np.ndarray] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self._entries.values())
+
+    def get(self, key: Hashable, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        values = self._entries.get(key)
+        if values is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return values
+        self.misses += 1
+        values = np.ascontiguousarray(compute())
+        values.setflags(write=False)
+        self._entries[key] = values
+        while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+            self._entries.popitem(last=False)
+        return values
+
+    def clear(self):
+        self._entries.clear()
+
+
+class WaveProjector:
+    """
+    Projects the model onto a dataset for many parameter vectors at once.
+
+    The model is a coherent sum of waves within each reflectivity, so the projected
+    yield is the quadratic form c^† M c of the complex wave coefficients c with the
+    matrix of weighted Zlm products M_ij = Σ w Z_i Z_j^* / N over the dataset. This is
+    what ``NLL.project`` sums to, and ``NLL.project_with`` for a single wave is the
+    corresponding diagonal term. N defaults to the number of events in the dataset,
+    and ``values`` may pass in precomputed `zlm_values` of the dataset.
+    """
+
+    def __init__(
+        self,
+        waves: Sequence['Wave'],
+        parameters: list[str],
+        dataset: ld.Dataset,
+        normalization: int | None = None,
+        values: np.ndarray | None = None,
+    ):
+        self.waves = list(waves)
+        if values is None:
+            values = zlm_values(self.waves, dataset)
+        weighted = values * dataset.weights[:, np.newaxis]
+        if normalization is None:
+            normalization = len(dataset)
+        integrals = weighted.T @ values.conj() / max(normalization, 1)
+        reflectivity = np.array([wave.r for wave in self.waves])
+        self.integrals = np.where(
+            reflectivity[:, np.newaxis] == reflectivity[np.newaxis, :], integrals, 0.0
+        )
+        self.real_index = np.array(
+            [parameters.index(f'{wave} real') for wave in self.waves]
+        )
+        self.imag_index = np.array(
+            [
+                parameters.index(f'{wave} imag') if f'{wave} imag' in parameters else -1
+                for wave in self.waves
+            ]
+        )
+
+    def coefficients(self, parameters: np.ndarray) -> np.ndarray:
+        parameters = np.atleast_2d(parameters)
+        imag = np.where(
+            self.imag_index >= 0, parameters[:, np.maximum(self.imag_index, 0)], 0.0
+        )
+        return parameters[:, self.real_index] + 1j * imag
+
+    def project(self, parameters: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the total projected yield with shape (n,) and the yield of each wave
+        with shape (n, waves) for an (n, parameters) array of parameter vectors.
+        """
+        coefficients = self.coefficients(parameters)
+        total = np.einsum(
+            'ki,ij,kj->k', coefficients, self.integrals, coefficients.conj()
+        ).real
+        per_wave = np.abs(coefficients) ** 2 * self.integrals.diagonal().real
+        return total, per_wave
+
+    def terms(self, parameters: np.ndarray) -> np.ndarray:
+        """
+        Returns Re(c_i M_ij c_j^*) with shape (n, waves, waves), whose diagonal is the
+        yield of each wave and whose sum is the total yield.
+        """
+        coefficients = self.coefficients(parameters)
+        return np.einsum(
+            'ki,ij,kj->kij', coefficients, self.integrals, coefficients.conj()
+        ).real
+
+
+@dataclass
+class Yields:
+    waves: list['Wave']
+    terms: np.ndarray  # (n, waves, waves), see `WaveProjector.terms`
+
+    @property
+    def total(self) -> np.ndarray:
+        return self.terms.sum(axis=(1, 2))
+
+    @property
+    def per_wave(self) -> np.ndarray:
+        return self.terms.diagonal(axis1=1, axis2=2)
+
+    def interference(self, i: int, j: int) -> np.ndarray:
+        return self.terms[:, i, j] + self.terms[:, j, i]
+
+
+class BatchNLL:
+    """
+    Evaluates the extended NLL of a bin for many parameter vectors at once,
+    -2 (Σ_data w ln I - Σ_accmc w I / N), using precomputed Zlm values for the data
+    and the `WaveProjector` quadratic form for the accepted MC. Candidates are
+    processed in chunks of roughly ``chunk_size`` (candidate, event) pairs.
+    """
+
+    def __init__(
+        self,
+        waves: Sequence['Wave'],
+        parameters: list[str],
+        data: ld.Dataset,
+        accmc: ld.Dataset,
+        chunk_size: int = 1 << 22,
+        *,
+        data_values: np.ndarray | None = None,
+        accmc_values: np.ndarray | None = None,
+    ):
+        self.projector = WaveProjector(waves, parameters, accmc, values=accmc_values)
+        self.values = (
+            data_values
+            if data_values is not None
+            else zlm_values(self.projector.waves, data)
+        )
+        self.weights = np.asarray(data.weights)
+        reflectivity = np.array([wave.r for wave in self.projector.waves])
+        self.groups = [reflectivity == r for r in np.unique(reflectivity)]
+        self.chunk_size = chunk_size
+
+    def reweighted(self, factors: np.ndarray) -> 'BatchNLL':
+        """
+        A copy sharing the precomputed values whose data weights are multiplied by
+        ``factors``, such as the event counts of a bootstrap replica.
+        """
+        out = copy.copy(self)
+        out.weights = self.weights * factors
+        return out
+
+    def evaluate(self, parameters: np.ndarray) -> np.ndarray:
+        parameters = np.atleast_2d(parameters)
+        out = np.empty(len(parameters))
+        step = max(1, self.chunk_size // max(len(self.weights), 1))
+        for start in range(0, len(parameters), step):
+            chunk = parameters[start : start + step]
+            coefficients = self.projector.coefficients(chunk)
+            intensity = np.zeros((len(chunk), len(self.weights)))
+            for group in self.groups:
+                intensity += np.abs(coefficients[:, group] @ self.values[:, group].T) ** 2
+            with np.errstate(divide='ignore'):
+                log_likelihood = np.log(intensity) @ self.weights
+            out[start : start + step] = -2.0 * (
+                log_likelihood - self.projector.project(chunk)[0]
+            )
+        return out
+
+
+class FastNLL(BatchNLL):
+    """
+    `BatchNLL` for a single parameter vector, with its analytic gradient. The
+    normalization is a (waves × waves) quadratic form, so neither costs anything
+    proportional to the size of the accepted MC.
+    """
+
+    def value_and_gradient(self, parameters: np.ndarray) -> tuple[float, np.ndarray]:
+        coefficients = self.projector.coefficients(parameters)[0]
+        intensity = np.zeros(len(self.weights))
+        # Σ_e w_e / I_e conj(a_e) Z_ie, with a_e the summed amplitude of the wave's group
+        data_gradient = np.zeros(len(coefficients), dtype=np.complex128)
+        amplitudes = []
+        for group in self.groups:
+            amplitude = self.values[:, group] @ coefficients[group]
+            intensity += np.abs(amplitude) ** 2
+            amplitudes.append(amplitude)
+        with np.errstate(divide='ignore'):
+            log_likelihood = np.log(intensity) @ self.weights
+            scale = self.weights / intensity
+        for group, amplitude in zip(self.groups, amplitudes):
+            data_gradient[group] = (scale * amplitude.conj()) @ self.values[:, group]
+        integrals = self.projector.integrals @ coefficients.conj()
+        normalization = (coefficients @ integrals).real
+        complex_gradient = data_gradient - integrals
+        gradient = np.zeros(len(parameters))
+        gradient[self.projector.real_index] = -4.0 * complex_gradient.real
+        has_imag = self.projector.imag_index >= 0
+        gradient[self.projector.imag_index[has_imag]] = (
+            4.0 * complex_gradient.imag[has_imag]
+        )
+        return -2.0 * (log_likelihood - normalization), gradient
@@ -0,0 +1,442 @@
+"""
+Headless runner for ``zlmfit run config.toml [--jsonl]``. A config looks like::
+
+    [data]
+    data = "data.parquet"
+    accmc = "accmc.parquet"
+    genmc = "genmc.parquet"
+
+    [binning]
+    bins = 40
+    lower = 1.0
+    upper = 2.0
+
+    [waves]
+    positive = ["0+0+1", "2+2+1"]  # written as l, m, reflectivity
+    positive_anchor = "0+0+1"  # defaults to the first wave
+    negative = []
+
+    [fit]
+    niters = 20
+    workers = 4
+    seed = 0
+    output = "fit.zlmfit"
+    resume = false
+    warm_start = false  # continue fits outward from anchor_bin
+    anchor_bin = 0
+    warm_niters = 2  # random starts per bin besides the neighbouring fits
+    start_method = "uniform"  # or "lhs", "halton", "sobol" (needs scipy)
+    scale_starts = false  # scale random starts to the bin's event count
+    prescreen = 0  # minimize only the best of this many random candidates
+    fast_likelihood = false  # normalize with precomputed accepted-MC integrals
+    amplitude_cache_mb = 1024  # memory for cached per-bin Zlm values
+    refine = false  # fit coarse_bins first and seed each bin from the overlapping ones
+    refine_niters = 2
+    coarse_bins = [5, 10]
+    adaptive = false  # stop a bin once its best NLL has been found nreproduce times
+    nreproduce = 3
+    reproduce_tol = 1e-3
+
+    [bootstrap]  # optional
+    nboot = 20
+    mode = "resample"  # or "poisson"/"multinomial" to reweight the events of each bin
+
+    [mcmc]  # optional
+    nwalkers = 20
+    sigma = 0.1
+    ntau = 20
+    dtau = 0.05
+    max_steps = 3000
+    thin = 1  # keep every thin-th step of the chains written next to the output
+    burn = 0  # steps discarded from the start of the written chains
+    chain_dtype = "float64"  # or "float32"
+    walker_init = "ball"  # or "covariance" (of the bootstrap fits, else of the fit)
+    streaming_tau = false  # estimate τ by batch means, keeping no chain in memory
+
+    [[scan]]  # optional, repeated: fit each wave set instead of [waves] and compare
+    positive = ["0+0+1", "1+1+1"]
+    negative = ["0+0-1"]
+
+    [cache]  # optional, reuses per-bin results of earlier runs with the same inputs
+    directory = ""  # defaults to ~/.cache/zlmfit
+    max_mb = 4096
+    content_digests = false  # match inputs by contents rather than path and mtime
+
+Exits with 0 on success, 1 if the run fails, and 2 if the config is invalid.
+"""
+
+import json
+import sys
+import time
+import tomllib
+from pathlib import Path
+from typing import Any, TextIO
+
+import laddu as ld
+
+from zlmfit.cache import ResultCache, default_directory
+from zlmfit.chains import StoredChain, convergence_summary
+from zlmfit.fit_data import (
+    BOOTSTRAP_MODES,
+    WALKER_INITS,
+    FitData,
+    ScanResult,
+    Wave,
+    WaveSet,
+)
+from zlmfit.optimize import MinimizeStatus
+from zlmfit.scan import compare, format_table
+from zlmfit.starts import START_METHODS, sobol_available
+
+
+class ConfigError(Exception):
+    pass
+
+
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1
+EXIT_CONFIG = 2
+
+
+class Reporter:
+    def __init__(self, stream: TextIO = sys.stdout, *, jsonl: bool = False):
+        self.stream = stream
+        self.jsonl = jsonl
+        self.start = time.perf_counter()
+
+    def __call__(self, event: str, message: str, **fields: Any):
+        if self.jsonl:
+            record = {'event': event, 'time': round(time.perf_counter() - self.start, 3)}
+            record.update(fields)
+            self.stream.write(json.dumps(record) + '\n')
+        else:
+            self.stream.write(f'[{time.perf_counter() - self.start:10.1f}s] {message}\n')
+        self.stream.flush()
+
+
+def _get(table: dict[str, Any], key: str, kind: type, default: Any = None) -> Any:
+    value = table.get(key, default)
+    if value is None:
+        raise ConfigError(f'Missing required setting {key!r}')
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if not isinstance(value, kind) or isinstance(value, bool) and kind is not bool:
+        raise ConfigError(f'Setting {key!r} must be of type {kind.__name__}')
+    return value
+
+
+def _waves(
+    table: dict[str, Any], key: str, r: int
+) -> tuple[list[Wave] | None, int | None]:
+    names = table.get(key)
+    if not names:
+        return None, None
+    try:
+        waves = [Wave.from_str(name) for name in names]
+        anchor = Wave.from_str(table.get(f'{key}_anchor', names[0]))
+    except ValueError as e:
+        raise ConfigError(str(e)) from e
+    if any(wave.r != r for wave in waves):
+        raise ConfigError(f'All {key} waves must have reflectivity {r:+}')
+    if anchor not in waves:
+        raise ConfigError(f'Anchor {anchor} is not one of the {key} waves')
+    return waves, waves.index(anchor)
+
+
+def _wave_set(table: dict[str, Any]) -> WaveSet:
+    pos_waves, pos_anchor = _waves(table, 'positive', +1)
+    neg_waves, neg_anchor = _waves(table, 'negative', -1)
+    if pos_waves is None and neg_waves is None:
+        raise ConfigError('Every wave set of a scan needs at least one wave')
+    return WaveSet(
+        tuple(pos_waves) if pos_waves is not None else None,
+        pos_anchor,
+        tuple(neg_waves) if neg_waves is not None else None,
+        neg_anchor,
+    )
+
+
+def load_config(path: Path) -> dict[str, Any]:
+    try:
+        with path.open('rb') as f:
+            return tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise ConfigError(f'Could not read {path}: {e}') from e
+
+
+def configure(config: dict[str, Any], base: Path) -> tuple[FitData, bool]:
+    """
+    Builds a `FitData` from a parsed config file, resolving relative paths against
+    ``base``. Returns the fit data and whether an existing output file is resumed.
+    """
+    files = config.get('data', {})
+    paths = {key: base / _get(files, key, str) for key in ('data', 'accmc', 'genmc')}
+    for key, path in paths.items():
+        if not path.exists():
+            raise ConfigError(f'{key} file {path} does not exist')
+
+    binning = config.get('binning', {})
+    waves = config.get('waves', {})
+    fit = config.get('fit', {})
+    wave_sets = None
+    if 'scan' in config:
+        # the union of all sets is used for everything but the fits themselves
+        wave_sets = [_wave_set(table) for table in config['scan']]
+        if not wave_sets:
+            raise ConfigError('A scan needs at least one wave set')
+        union = WaveSet.union(wave_sets)
+        pos_waves = list(union.pos_waves) if union.pos_waves else None
+        neg_waves = list(union.neg_waves) if union.neg_waves else None
+        pos_anchor, neg_anchor = union.pos_anchor, union.neg_anchor
+    else:
+        pos_waves, pos_anchor = _waves(waves, 'positive', +1)
+        neg_waves, neg_anchor = _waves(waves, 'negative', -1)
+    if pos_waves is None and neg_waves is None:
+        raise ConfigError('At least one wave must be selected')
+
+    fit_data = FitData(
+        ld.open(str(paths['data'])),
+        ld.open(str(paths['accmc'])),
+        paths['genmc'],
+    )
+    fit_data.input_paths = (paths['data'], paths['accmc'], paths['genmc'])
+    fit_data.bins = _get(binning, 'bins', int)
+    fit_data.lower = _get(binning, 'lower', float)
+    fit_data.upper = _get(binning, 'upper', float)
+    if fit_data.bins <= 0 or fit_data.lower >= fit_data.upper:
+        raise ConfigError('Binning needs bins > 0 and lower < upper')
+    fit_data.set_waves(pos_waves, pos_anchor, neg_waves, neg_anchor)
+    fit_data.wave_sets = wave_sets
+    fit_data.niters = _get(fit, 'niters', int, 20)
+    fit_data.workers = _get(fit, 'workers', int, 1)
+    fit_data.seed = _get(fit, 'seed', int, 0)
+    fit_data.output_path = base / _get(fit, 'output', str, 'fit.zlmfit')
+    if fit_data.niters <= 0 or fit_data.workers <= 0:
+        raise ConfigError('niters and workers must be > 0')
+    fit_data.warm_start = _get(fit, 'warm_start', bool, False)
+    if fit_data.warm_start:
+        fit_data.anchor_bin = _get(fit, 'anchor_bin', int, 0)
+        fit_data.warm_niters = _get(fit, 'warm_niters', int, 2)
+        if not 0 <= fit_data.anchor_bin < fit_data.bins or fit_data.warm_niters < 0:
+            raise ConfigError('anchor_bin must be a bin index and warm_niters >= 0')
+    fit_data.refine = _get(fit, 'refine', bool, False)
+    if fit_data.refine:
+        fit_data.refine_niters = _get(fit, 'refine_niters', int, 2)
+        fit_data.coarse_bins = sorted(_get(fit, 'coarse_bins', list, []))
+        if fit_data.refine_niters < 0 or not all(
+            isinstance(bins, int) and bins > 0 for bins in fit_data.coarse_bins
+        ):
+            raise ConfigError('refine_niters must be >= 0 and coarse_bins positive')
+    fit_data.start_method = _get(fit, 'start_method', str, 'uniform')
+    if fit_data.start_method not in START_METHODS:
+        raise ConfigError(f'start_method must be one of {", ".join(START_METHODS)}')
+    if fit_data.start_method == 'sobol' and not sobol_available():
+        raise ConfigError("start_method 'sobol' needs scipy, which is not installed")
+    fit_data.scale_starts = _get(fit, 'scale_starts', bool, False)
+    fit_data.prescreen = _get(fit, 'prescreen', int, 0)
+    if fit_data.prescreen < 0:
+        raise ConfigError('prescreen must be >= 0')
+    fit_data.fast_likelihood = _get(fit, 'fast_likelihood', bool, False)
+    fit_data.amplitudes.max_bytes = _get(fit, 'amplitude_cache_mb', int, 1024) << 20
+    fit_data.adaptive = _get(fit, 'adaptive', bool, False)
+    if fit_data.adaptive:
+        fit_data.nreproduce = _get(fit, 'nreproduce', int, 3)
+        fit_data.reproduce_tol = _get(fit, 'reproduce_tol', float, 1e-3)
+        if fit_data.nreproduce <= 0 or fit_data.reproduce_tol < 0.0:
+            raise ConfigError('nreproduce must be > 0 and reproduce_tol >= 0')
+    resume = _get(fit, 'resume', bool, False)
+
+    if 'bootstrap' in config:
+        fit_data.bootstrap = True
+        fit_data.nboot = _get(config['bootstrap'], 'nboot', int, 20)
+        fit_data.bootstrap_mode = _get(config['bootstrap'], 'mode', str, 'resample')
+        if fit_data.bootstrap_mode not in BOOTSTRAP_MODES:
+            raise ConfigError(f'mode must be one of {", ".join(BOOTSTRAP_MODES)}')
+    if 'cache' in config:
+        cache = config['cache']
+        directory = _get(cache, 'directory', str, '')
+        fit_data.result_cache = ResultCache(
+            base / directory if directory else default_directory(),
+            _get(cache, 'max_mb', int, 4096) << 20,
+            content_digests=_get(cache, 'content_digests', bool, False),
+        )
+    if 'mcmc' in config:
+        mcmc = config['mcmc']
+        fit_data.mcmc = True
+        fit_data.nwalkers = _get(mcmc, 'nwalkers', int, 20)
+        fit_data.sigma = _get(mcmc, 'sigma', float, 0.1)
+        fit_data.ntau = _get(mcmc, 'ntau', int, 20)
+        fit_data.dtau = _get(mcmc, 'dtau', float, 0.05)
+        fit_data.streaming_tau = _get(mcmc, 'streaming_tau', bool, False)
+        fit_data.max_steps = _get(mcmc, 'max_steps', int, 3000)
+        fit_data.thin = _get(mcmc, 'thin', int, 1)
+        fit_data.burn = _get(mcmc, 'burn', int, 0)
+        fit_data.chain_dtype = _get(mcmc, 'chain_dtype', str, 'float64')
+        if fit_data.max_steps <= 0 or fit_data.thin <= 0 or fit_data.burn < 0:
+            raise ConfigError('max_steps and thin must be > 0 and burn >= 0')
+        if fit_data.chain_dtype not in ('float32', 'float64'):
+            raise ConfigError('chain_dtype must be float32 or float64')
+        fit_data.walker_init = _get(mcmc, 'walker_init', str, 'ball')
+        if fit_data.walker_init not in WALKER_INITS:
+            raise ConfigError(f'walker_init must be one of {", ".join(WALKER_INITS)}')
+    return fit_data, resume
+
+
+def run_stages(fit_data: FitData, report: Reporter):
+    """
+    Runs every enabled stage on the selected bins, checkpointing into the open store.
+    """
+    if fit_data.wave_sets is not None:
+        run_scan(fit_data, report)
+        return
+    report(
+        'stage',
+        f'Fitting {len(fit_data.selected_bins())} bins on {fit_data.workers} worker(s)',
+        stage='fit',
+    )
+
+    done: dict[int, int] = {}
+
+    def fit_progress(ibin: int, iiter: int, status: ld.Status):
+        report(
+            'fit',
+            f'Bin {ibin}: fit iteration {iiter} finished (NLL = {status.fx})',
+            bin=ibin,
+            iteration=iiter,
+            fx=status.fx,
+            converged=status.converged,
+        )
+        done[ibin] = done.get(ibin, 0) + 1
+        if done[ibin] == fit_data.fit_starts[ibin]:
+            report(
+                'fit_bin',
+                f'Bin {ibin} complete after {done[ibin]} fit(s)',
+                bin=ibin,
+                nstarts=done[ibin],
+            )
+
+    fit_result = fit_data.run_fit(fit_progress)
+    bootstrap_result = None
+    if fit_data.bootstrap:
+        report('stage', 'Bootstrapping', stage='bootstrap')
+
+        def bootstrap_progress(ibin: int, iboot: int, status: ld.Status):
+            report(
+                'bootstrap',
+                f'Bin {ibin}: bootstrap {iboot} finished (NLL = {status.fx})',
+                bin=ibin,
+                bootstrap=iboot,
+                fx=status.fx,
+                converged=status.converged,
+            )
+
+        bootstrap_result = fit_data.run_bootstrap(fit_result, bootstrap_progress)
+    if fit_data.mcmc:
+        report('stage', 'Running MCMC', stage='mcmc')
+
+        def mcmc_progress(ibin: int, chain: StoredChain):
+            report(
+                'mcmc',
+                f'Bin {ibin}: {chain.steps} steps with tau = {chain.tau}'
+                f' ({chain.kept} kept, {chain.init} start)',
+                bin=ibin,
+                steps=chain.steps,
+                kept=chain.kept,
+                tau=chain.tau,
+                converged=chain.converged,
+                init=chain.init,
+            )
+
+        mcmc_result = fit_data.run_mcmc(
+            fit_result, mcmc_progress, bootstrap_results=bootstrap_result
+        )
+        for init, line in convergence_summary(list(mcmc_result.values())).items():
+            report('mcmc_summary', f'Walker starts from {line}', init=init)
+
+
+def run_scan(fit_data: FitData, report: Reporter):
+    assert fit_data.wave_sets is not None
+    wave_sets = fit_data.wave_sets
+    report(
+        'stage',
+        f'Scanning {len(wave_sets)} wave sets in {len(fit_data.selected_bins())} bins'
+        f' on {fit_data.workers} worker(s)',
+        stage='scan',
+    )
+
+    def scan_progress(ibin: int, iset: int, status: MinimizeStatus):
+        report(
+            'scan',
+            f'Bin {ibin}: best fit of [{wave_sets[iset]}] has NLL = {status.fx}',
+            bin=ibin,
+            wave_set=str(wave_sets[iset]),
+            fx=status.fx,
+            converged=status.converged,
+        )
+
+    write_scan(fit_data, fit_data.run_scan(scan_progress), report)
+
+
+def write_scan(fit_data: FitData, results: ScanResult, report: Reporter):
+    """
+    Writes the wave set comparison of a scan next to the output file and reports it.
+    """
+    rows = compare(fit_data, results)
+    table = format_table(rows)
+    path = fit_data.output_path.with_suffix('.scan.txt')
+    path.write_text(table + '\n')
+    report(
+        'scan_table',
+        f'Wave set comparison (also written to {path}):\n{table}',
+        table=str(path),
+        rows=[
+            {
+                'bin': row.ibin,
+                'wave_set': row.wave_set,
+                'fx': row.nll,
+                'nparams': row.nparams,
+                'aic': row.aic,
+                'bic': row.bic,
+            }
+            for row in rows
+        ],
+    )
+
+
+def run_fit_data(fit_data: FitData, report: Reporter):
+    fit_data.bin_datasets()
+    fit_data.open_store()
+    try:
+        run_stages(fit_data, report)
+        if fit_data.wave_sets is not None:
+            report('done', f'Results written to {fit_data.output_path}')
+            return
+        path = fit_data.export_columnar()
+        report(
+            'done',
+            f'Results written to {fit_data.output_path} and {path}',
+            output=str(fit_data.output_path),
+            columnar=str(path),
+        )
+    finally:
+        if fit_data.store is not None:
+            fit_data.store.close()
+            fit_data.store = None
+
+
+def run(config_path: Path, *, jsonl: bool = False) -> int:
+    report = Reporter(jsonl=jsonl)
+    try:
+        fit_data, resume = configure(load_config(config_path), config_path.parent)
+        if fit_data.output_path.exists() and not resume:
+            raise ConfigError(
+                f'{fit_data.output_path} already exists (set resume = true)'
+            )
+        run_fit_data(fit_data, report)
+    except ConfigError as e:
+        report('error', f'Configuration error: {e}', error=str(e), kind='config')
+        return EXIT_CONFIG
+    except Exception as e:
+        report('error', f'Run failed: {e!r}', error=repr(e), kind='runtime')
+        return EXIT_FAILURE
+    return EXIT_SUCCESS
@@ -0,0 +1,193 @@
+"""
+Cache of per-bin results, shared by every run on a machine.
+
+Results are stored under the hash of everything that determines them: the input
+files, the binning, the waves, and the settings of the stage that produced them
+(later stages also include the fit settings, since they start from the fit).
+Rerunning a fit with an unchanged configuration, or writing it to a new output file,
+then loads the results instead of refitting, and changing only the bootstrap or MCMC
+settings recomputes only those stages.
+
+Input files are identified by path, size and modification time, so nothing is read
+to look up a result. With ``content_digests``, they are identified by a hash of their
+contents instead (remembered by path, size and modification time), so that results
+are also found for copies of the inputs, at the cost of reading each new file once.
+
+Entries are single pickles written atomically, and the chains of MCMC results are
+copied next to their entry. Reading an entry marks it as used, and the least recently
+used entries are deleted once the cache exceeds ``max_bytes``.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+from zlmfit.chains import StoredChain
+
+VERSION = 1
+DIGESTS = 'digests.json'
+
+# results produced by each stage, the first being the one every bin must have
+STAGE_KEYS = {
+    'fit': ('fit_result', 'fit_origin'),
+    'scan': ('scan_result',),
+    'bootstrap': ('bootstrap_result',),
+    'mcmc': ('mcmc_result',),
+}
+STAGE_OF_KEY = {key: stage for stage, keys in STAGE_KEYS.items() for key in keys}
+
+
+def default_directory() -> Path:
+    base = os.environ.get('XDG_CACHE_HOME')
+    return (Path(base) if base else Path.home() / '.cache') / 'zlmfit'
+
+
+def file_identity(path: Path) -> str:
+    stat = path.stat()
+    description = f'{path.resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}'
+    return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+
+def directory_size(directory: Path) -> int:
+    return sum(path.stat().st_size for path in directory.rglob('*') if path.is_file())
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with path.open('rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(
+        self, directory: Path, max_bytes: int = 4 << 30, *, content_digests: bool = False
+    ):
+        # absolute, since the chains of MCMC results are stored under it
+        self.directory = directory.resolve()
+        self.max_bytes = max_bytes
+        self.content_digests = content_digests
+        self.hits = 0
+        self.misses = 0
+        self._nbytes: int | None = None
+        self._digests: dict[str, list] | None = None
+
+    def input_digests(self, paths: Sequence[Path]) -> list[str]:
+        """
+        Digests identifying the input files: their path, size and modification time,
+        or with `content_digests` their contents. Content digests are remembered by
+        path, size and modification time, so unchanged files are only read once.
+        """
+        if not self.content_digests:
+            return [file_identity(path) for path in paths]
+        known_path = self.directory / DIGESTS
+        if self._digests is None:
+            try:
+                self._digests = json.loads(known_path.read_text())
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._digests = {}
+        digests = []
+        changed = False
+        for path in paths:
+            name = str(path.resolve())
+            stat = path.stat()
+            entry = self._digests.get(name)
+            if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+                entry = [stat.st_size, stat.st_mtime_ns, file_digest(path)]
+                self._digests[name] = entry
+                changed = True
+            digests.append(entry[2])
+        if changed:
+            self._write(known_path, json.dumps(self._digests).encode())
+        return digests
+
+    @staticmethod
+    def key(digests: list[str], settings: dict[str, Any]) -> str:
+        description = json.dumps(
+            {'version': VERSION, 'inputs': digests, 'settings': settings},
+            sort_keys=True,
+        )
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def path(self, key: str, name: str, ibin: int) -> Path:
+        return self.directory / key[:2] / f'{key}-{name}-{ibin:05d}.pkl'
+
+    def get(self, key: str, name: str, ibin: int) -> Any | None:
+        path = self.path(key, name, ibin)
+        try:
+            with path.open('rb') as f:
+                data = pickle.load(f)
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, name: str, ibin: int, data: Any):
+        path = self.path(key, name, ibin)
+        nbytes = 0
+        if isinstance(data, StoredChain):
+            # the run that wrote the chain may be deleted, so the entry keeps a copy
+            data = data.copy_to(path.with_suffix('.chains'))
+            nbytes += directory_size(data.directory)
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        self._write(path, payload)
+        if self._nbytes is not None:
+            self._nbytes += nbytes + len(payload)
+        if self.nbytes > self.max_bytes:
+            self.evict()
+
+    def _write(self, path: Path, payload: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        staging.write_bytes(payload)
+        staging.replace(path)
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.directory.glob('*/*.pkl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            size = stat.st_size
+            if path.with_suffix('.chains').is_dir():
+                size += directory_size(path.with_suffix('.chains'))
+            entries.append((stat.st_mtime, size, path))
+        return entries
+
+    @staticmethod
+    def _remove(path: Path):
+        path.unlink(missing_ok=True)
+        shutil.rmtree(path.with_suffix('.chains'), ignore_errors=True)
+
+    @property
+    def nbytes(self) -> int:
+        if self._nbytes is None:
+            self._nbytes = sum(size for _, size, _ in self._entries())
+        return self._nbytes
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the cache fits in ``max_bytes``.
+        """
+        entries = sorted(self._entries())
+        nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if nbytes <= self.max_bytes:
+                break
+            self._remove(path)
+            nbytes -= size
+        self._nbytes = nbytes
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+        self._nbytes = 0
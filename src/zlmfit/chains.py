@@ -0,0 +1,216 @@
+import shutil
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+
+class ChainBuffer:
+    """
+    Append-only buffer of per-step values, stored as one contiguous (steps, ...) array
+    whose capacity doubles whenever it fills up.
+    """
+
+    def __init__(self, dtype: npt.DTypeLike = np.float64, capacity: int = 256):
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self._data: np.ndarray | None = None
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, values: npt.ArrayLike):
+        values = np.asarray(values)
+        if self._data is None:
+            self._data = np.empty((self.capacity, *values.shape), dtype=self.dtype)
+        elif self._length == len(self._data):
+            data = np.empty(
+                (2 * len(self._data), *self._data.shape[1:]), dtype=self.dtype
+            )
+            data[: self._length] = self._data
+            self._data = data
+        self._data[self._length] = values
+        self._length += 1
+
+    @property
+    def array(self) -> np.ndarray:
+        if self._data is None:
+            return np.empty((0,), dtype=self.dtype)
+        return self._data[: self._length]
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes if self._data is not None else 0
+
+
+class BatchMeansAutocorrelation:
+    """
+    Streaming estimate of integrated autocorrelation times by the method of batch
+    means, τ ≈ b Var(batch means) / Var(samples). Complete batches keep their sums and
+    sums of squares, and adjacent batches are merged (doubling b) whenever there are
+    twice as many as requested, so each step costs O(walkers × parameters) and each
+    estimate O(batches × walkers × parameters) regardless of the chain length.
+
+    Batch means underestimate τ until the batches are much longer than τ, so estimates
+    with b < ``batch_factor`` × τ are reported as infinite.
+    """
+
+    def __init__(self, nbatches: int = 16, batch_factor: float = 2.0):
+        self.nbatches = nbatches
+        self.batch_factor = batch_factor
+        self.batch_size = 1
+        self.steps = 0
+        self._sums: np.ndarray | None = None  # (batches, walkers, parameters)
+        self._sumsqs: np.ndarray | None = None
+        self._complete = 0
+        self._count = 0
+
+    def update(self, values: npt.ArrayLike):
+        values = np.asarray(values, dtype=np.float64)
+        if self._sums is None or self._sumsqs is None:
+            self._sums = np.zeros((2 * self.nbatches + 1, *values.shape))
+            self._sumsqs = np.zeros((2 * self.nbatches + 1, *values.shape))
+        self._sums[self._complete] += values
+        self._sumsqs[self._complete] += values**2
+        self._count += 1
+        self.steps += 1
+        if self._count == self.batch_size:
+            self._complete += 1
+            self._count = 0
+            if self._complete == 2 * self.nbatches:
+                for buffer in (self._sums, self._sumsqs):
+                    buffer[: self.nbatches] = buffer[0:-1:2] + buffer[1::2]
+                    buffer[self.nbatches :] = 0.0
+                self._complete = self.nbatches
+                self.batch_size *= 2
+
+    def taus(self, discard: float = 0.0) -> np.ndarray:
+        if self._sums is None or self._sumsqs is None:
+            return np.array([np.inf])
+        skip = int(self._complete * discard)
+        sums = self._sums[skip : self._complete]
+        sumsqs = self._sumsqs[skip : self._complete]
+        if len(sums) < 2:
+            return np.full(self._sums.shape[-1], np.inf)
+        n = len(sums) * self.batch_size
+        mean = sums.sum(axis=0) / n
+        variance = (sumsqs.sum(axis=0) / n - mean**2) * n / (n - 1)
+        batch_variance = (sums / self.batch_size).var(axis=0, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            taus = self.batch_size * batch_variance.mean(axis=0) / variance.mean(axis=0)
+        return np.where(self.batch_size >= self.batch_factor * taus, taus, np.inf)
+
+
+@dataclass
+class StoredChain:
+    """
+    An MCMC chain of one bin, stored by `ChainWriter` as numbered ``.npy`` segments of
+    shape (kept steps, walkers, parameters) in ``directory``.
+    """
+
+    directory: Path
+    steps: int  # steps sampled, including burn-in and thinned steps
+    kept: int
+    walkers: int
+    parameters: int
+    dtype: str
+    tau: float
+    converged: bool
+    init: str = 'ball'  # how the walkers were started
+
+    def segments(self) -> list[Path]:
+        return sorted(self.directory.glob('*.npy'))
+
+    def available(self) -> bool:
+        return sum(len(np.load(path, mmap_mode='r')) for path in self.segments()) == (
+            self.kept
+        )
+
+    def load(self) -> np.ndarray:
+        if self.kept == 0:
+            return np.empty((0, self.walkers, self.parameters), dtype=self.dtype)
+        return np.concatenate([np.load(path) for path in self.segments()])
+
+    def copy_to(self, directory: Path) -> 'StoredChain':
+        shutil.rmtree(directory, ignore_errors=True)
+        shutil.copytree(self.directory, directory)
+        return replace(self, directory=directory)
+
+
+class ChainWriter:
+    """
+    Streams the chain of one bin to disk segment by segment, keeping every ``thin``-th
+    step after the first ``burn`` steps (as ``dtype``), so only one segment is ever
+    held in memory.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        thin: int = 1,
+        burn: int = 0,
+        dtype: npt.DTypeLike = np.float64,
+    ):
+        self.directory = directory
+        self.thin = thin
+        self.burn = burn
+        self.dtype = np.dtype(dtype)
+        self.steps = 0
+        self.kept = 0
+        self._segments = 0
+        self._shape: tuple[int, int] = (0, 0)
+        # a restarted bin starts over
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+
+    def write(self, chain: np.ndarray):
+        """
+        Appends a (walkers, steps, parameters) chain segment.
+        """
+        self._shape = (chain.shape[0], chain.shape[2])
+        steps = np.arange(self.steps, self.steps + chain.shape[1])
+        keep = (steps >= self.burn) & ((steps - self.burn) % self.thin == 0)
+        self.steps += chain.shape[1]
+        if not keep.any():
+            return
+        segment = np.ascontiguousarray(chain[:, keep].transpose(1, 0, 2), self.dtype)
+        path = self.directory / f'{self._segments:06d}.npy'
+        staging = path.with_name(f'.{path.name}.tmp')
+        with staging.open('wb') as f:
+            np.save(f, segment)
+        staging.replace(path)
+        self._segments += 1
+        self.kept += len(segment)
+
+    def finish(self, tau: float, converged: bool) -> StoredChain:
+        return StoredChain(
+            self.directory,
+            self.steps,
+            self.kept,
+            *self._shape,
+            self.dtype.str,
+            tau,
+            converged,
+        )
+
+
+def convergence_summary(chains: list[StoredChain]) -> dict[str, str]:
+    """
+    A line for each walker initialization strategy with the number of bins that
+    converged and the steps they took, to compare strategies across a run.
+    """
+    lines = {}
+    for init in sorted({chain.init for chain in chains}):
+        group = [chain for chain in chains if chain.init == init]
+        steps = [chain.steps for chain in group if chain.converged]
+        line = f'{init}: {len(steps)}/{len(group)} bins converged'
+        if steps:
+            line += (
+                f' in {np.median(steps):.0f} steps (median,'
+                f' range {min(steps)}-{max(steps)})'
+            )
+        lines[init] = line
+    return lines
@@ -0,0 +1,247 @@
+import argparse
+import json
+import pickle
+import shutil
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from zlmfit.chains import StoredChain
+from zlmfit.store import MAGIC, ResultStore
+
+INDEX = 'index.json'
+VERSION = 1
+
+
+def parameter_names(config: dict[str, Any]) -> list[str]:
+    names = []
+    for waves, anchor in (
+        (config.get('pos_waves') or [], config.get('pos_anchor')),
+        (config.get('neg_waves') or [], config.get('neg_anchor')),
+    ):
+        for i, wave in enumerate(waves):
+            names.append(f'{wave} real')
+            if i != anchor:
+                names.append(f'{wave} imag')
+    return names
+
+
+def _status_columns(statuses: list[Any], nparams: int) -> dict[str, np.ndarray]:
+    def err(status: Any) -> np.ndarray:
+        return status.err if status.err is not None else np.full(nparams, np.nan)
+
+    return {
+        'x': np.array([status.x for status in statuses]).reshape(-1, nparams),
+        'err': np.array([err(status) for status in statuses]).reshape(-1, nparams),
+        'fx': np.array([status.fx for status in statuses], dtype=np.float64),
+        'converged': np.array([status.converged for status in statuses], dtype=bool),
+        'n_f_evals': np.array([status.n_f_evals for status in statuses], dtype=np.int64),
+        'n_g_evals': np.array([status.n_g_evals for status in statuses], dtype=np.int64),
+    }
+
+
+def write_columnar(
+    path: Path,
+    results: dict[str, dict[int, Any]],
+    *,
+    parameters: list[str] | None = None,
+    config: dict[str, Any] | None = None,
+):
+    """
+    Writes results to a directory of ``.npy`` blocks described by ``index.json``:
+
+    - ``fit_*``: one row per fitted bin (``fit_bins``), including the bin whose fit
+      seeded the best start (``fit_origin_bin``) and the number of starts tried
+    - ``bootstrap_*``: (bins, bootstraps, ...) for every bootstrapped bin
+    - ``mcmc_chain``: (steps, walkers, parameters) chains of all bins concatenated along
+      the steps axis, where bin ``mcmc_bins[i]`` spans ``mcmc_offsets[i:i + 2]``, with
+      the number of steps sampled and whether each bin converged
+    """
+    arrays: dict[str, np.ndarray] = {}
+    nparams = 0
+    index: dict[str, Any] = {'version': VERSION, 'config': config}
+
+    fit_result = results.get('fit_result', {})
+    if fit_result:
+        bins = sorted(fit_result)
+        nparams = len(fit_result[bins[0]].x)
+        index['fit_bins'] = bins
+        for name, column in _status_columns(
+            [fit_result[i] for i in bins], nparams
+        ).items():
+            arrays[f'fit_{name}'] = column
+        fit_origin = results.get('fit_origin', {})
+        if all(ibin in fit_origin for ibin in bins):
+            # -1 for random starting points
+            arrays['fit_origin_bin'] = np.array(
+                [fit_origin[i].get('bin', -1) for i in bins], dtype=np.int64
+            )
+            arrays['fit_nstarts'] = np.array(
+                [fit_origin[i]['nstarts'] for i in bins], dtype=np.int64
+            )
+
+    bootstrap_result = results.get('bootstrap_result', {})
+    if bootstrap_result:
+        bins = sorted(bootstrap_result)
+        nboot = len(bootstrap_result[bins[0]])
+        nparams = len(bootstrap_result[bins[0]][0].x)
+        index['bootstrap_bins'] = bins
+        columns = _status_columns(
+            [status for i in bins for status in bootstrap_result[i]], nparams
+        )
+        for name, column in columns.items():
+            arrays[f'bootstrap_{name}'] = column.reshape(
+                len(bins), nboot, *column.shape[1:]
+            )
+
+    mcmc_result = results.get('mcmc_result', {})
+    chains: list[Any] = []
+    if mcmc_result:
+        bins = sorted(mcmc_result)
+        # results from before chains were streamed to disk hold (ensemble, tau)
+        chains = [
+            mcmc_result[i]
+            if isinstance(mcmc_result[i], StoredChain)
+            else mcmc_result[i][0].get_chain().transpose(1, 0, 2)
+            for i in bins
+        ]
+        lengths = [
+            chain.kept if isinstance(chain, StoredChain) else len(chain)
+            for chain in chains
+        ]
+        first = chains[0]
+        nparams = first.shape[-1] if isinstance(first, np.ndarray) else first.parameters
+        index['mcmc_bins'] = bins
+        index['mcmc_offsets'] = np.cumsum([0, *lengths]).tolist()
+        arrays['mcmc_tau'] = np.array(
+            [
+                chain.tau if isinstance(chain, StoredChain) else mcmc_result[i][1]
+                for i, chain in zip(bins, chains)
+            ],
+            dtype=np.float64,
+        )
+        if all(isinstance(chain, StoredChain) for chain in chains):
+            arrays['mcmc_steps'] = np.array([chain.steps for chain in chains])
+            arrays['mcmc_converged'] = np.array([chain.converged for chain in chains])
+
+    if parameters is None:
+        parameters = parameter_names(config) if config is not None else []
+    if len(parameters) != nparams:
+        parameters = [f'p{i}' for i in range(nparams)]
+    index['parameters'] = parameters
+    index['arrays'] = {
+        name: {'shape': list(array.shape), 'dtype': array.dtype.str}
+        for name, array in arrays.items()
+    }
+    if chains:
+        walkers = first.shape[1] if isinstance(first, np.ndarray) else first.walkers
+        chain_dtype = np.result_type(*(chain.dtype for chain in chains))
+        index['arrays']['mcmc_chain'] = {
+            'shape': [index['mcmc_offsets'][-1], walkers, nparams],
+            'dtype': chain_dtype.str,
+        }
+
+    staging = path.with_name(f'.{path.name}.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(staging / f'{name}.npy', np.ascontiguousarray(array))
+    if chains:
+        # copied one segment at a time, so chains never have to fit in memory
+        info = index['arrays']['mcmc_chain']
+        out = np.lib.format.open_memmap(
+            staging / 'mcmc_chain.npy',
+            mode='w+',
+            dtype=np.dtype(info['dtype']),
+            shape=tuple(info['shape']),
+        )
+        offset = 0
+        for chain in chains:
+            segments = (
+                (np.load(path, mmap_mode='r') for path in chain.segments())
+                if isinstance(chain, StoredChain)
+                else [chain]
+            )
+            for segment in segments:
+                out[offset : offset + len(segment)] = segment
+                offset += len(segment)
+        out.flush()
+        del out
+    (staging / INDEX).write_text(json.dumps(index, indent=2))
+    shutil.rmtree(path, ignore_errors=True)
+    staging.rename(path)
+
+
+class ColumnarResults:
+    """
+    Read-only view of a columnar result directory. Arrays are memory-mapped, so
+    selecting one bin only reads that bin from disk, and laddu is not required.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.index: dict[str, Any] = json.loads((path / INDEX).read_text())
+        self.parameters: list[str] = self.index['parameters']
+        self.config: dict[str, Any] | None = self.index['config']
+        self._arrays: dict[str, np.ndarray] = {}
+
+    def array(self, name: str) -> np.ndarray:
+        if name not in self.index['arrays']:
+            raise KeyError(f'{self.path} has no array named {name!r}!')
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self.path / f'{name}.npy', mmap_mode='r')
+        return self._arrays[name]
+
+    def _row(self, stage: str, ibin: int) -> int:
+        bins = self.index.get(f'{stage}_bins', [])
+        if ibin not in bins:
+            raise KeyError(f'Bin {ibin} has no {stage} result!')
+        return bins.index(ibin)
+
+    def fit(self, ibin: int, column: str = 'x') -> np.ndarray:
+        return self.array(f'fit_{column}')[self._row('fit', ibin)]
+
+    def bootstrap(self, ibin: int, column: str = 'x') -> np.ndarray:
+        return self.array(f'bootstrap_{column}')[self._row('bootstrap', ibin)]
+
+    def chain(self, ibin: int) -> np.ndarray:
+        row = self._row('mcmc', ibin)
+        offsets = self.index['mcmc_offsets']
+        return self.array('mcmc_chain')[offsets[row] : offsets[row + 1]]
+
+
+def load_results(path: Path) -> tuple[dict[str, dict[int, Any]], dict[str, Any] | None]:
+    with path.open('rb') as f:
+        is_store = f.read(len(MAGIC)) == MAGIC
+    if is_store:
+        store = ResultStore(path)
+        return store.load(), store.metadata('config')
+    with path.open('rb') as f:
+        return pickle.load(f), None
+
+
+def convert(source: Path, destination: Path, parameters: list[str] | None = None):
+    results, config = load_results(source)
+    write_columnar(destination, results, parameters=parameters, config=config)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert a .zlmfit result file into the columnar .zlmcol format'
+    )
+    parser.add_argument('source', type=Path)
+    parser.add_argument('destination', type=Path, nargs='?')
+    parser.add_argument(
+        '--parameters', nargs='+', help='parameter names (for files without a config)'
+    )
+    args = parser.parse_args()
+    convert(
+        args.source,
+        args.destination or args.source.with_suffix('.zlmcol'),
+        args.parameters,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+from functools import partial
 from pathlib import Path
 from textual import on
 from textual.css.query import NoMatches
@@ -14,18 +15,28 @@ from textual.widgets import (
     Header,
     Input,
     Label,
+    ProgressBar,
     RadioButton,
     RadioSet,
 )
+from textual.worker import Worker, WorkerState
 
 import laddu as ld
+import numpy as np
 
-from zlmfit.fit_data import FitData
+from zlmfit.fit_data import FitData, mass_columns
 from zlmfit.wave_menu import WaveMenu
 from zlmfit.widgets.histogram import Histogram
 
 
 class DataBinner(Screen):
+    """
+    Datasets are opened by background workers so the screen stays responsive: the
+    histogram of the data is shown as soon as it is loaded, continuing is possible
+    once the accepted MC is loaded too, and the generated MC is only opened when its
+    histogram is requested (otherwise `FitData` opens it when a stage needs it).
+    """
+
     CSS_PATH = 'data_binner.tcss'
 
     def __init__(self, data_path: Path, accmc_path: Path, genmc_path: Path, **kwargs):
@@ -33,19 +44,24 @@ class DataBinner(Screen):
         self.data_path = data_path
         self.accmc_path = accmc_path
         self.genmc_path = genmc_path
-        self.data = ld.open(str(data_path))
-        self.accmc = ld.open(str(accmc_path))
-        self.genmc = ld.open(str(genmc_path))
-        self.fit_data = FitData(self.data, self.accmc, self.genmc)
+        self.data: ld.Dataset | None = None
+        self.accmc: ld.Dataset | None = None
+        self.genmc: ld.Dataset | None = None
+        self.columns: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self.fit_data: FitData | None = None
+        self.pending: dict[str, Path] = {}
 
     def compose(self):
         yield Header()
         yield Footer()
-        with RadioSet():
-            yield RadioButton('Data', value=True)
-            yield RadioButton('AccMC')
-            yield RadioButton('GenMC')
-        yield ScrollableContainer(Histogram(self.data))
+        with Horizontal(id='datasets'):
+            with RadioSet():
+                yield RadioButton('Data', value=True)
+                yield RadioButton('AccMC', disabled=True, id='show_accmc')
+                yield RadioButton('GenMC')
+            yield Label(id='loading_label')
+            yield ProgressBar(0, show_eta=False, id='loading')
+        yield ScrollableContainer(Histogram())
         with Container(id='settings'):
             yield Label('# Bins', id='bin_label')
             yield Input(
@@ -93,7 +109,85 @@ class DataBinner(Screen):
             )
         with Horizontal(id='navigation'):
             yield Button('Back', id='back')
-            yield Button('Continue', id='continue')
+            yield Button('Continue', id='continue', disabled=True)
+
+    def on_mount(self):
+        self.load('data', self.data_path)
+        self.load('accmc', self.accmc_path)
+
+    def load(self, name: str, path: Path):
+        self.pending[name] = path
+        self.query_one('#loading', ProgressBar).total = len(self.pending) + sum(
+            dataset is not None for dataset in (self.data, self.accmc, self.genmc)
+        )
+        self.update_loading()
+        self.run_worker(
+            partial(self.open_dataset, name, path),
+            name=name,
+            thread=True,
+            exit_on_error=False,
+        )
+
+    def open_dataset(
+        self, name: str, path: Path
+    ) -> tuple[ld.Dataset, tuple[np.ndarray, np.ndarray]]:
+        if name == 'genmc' and self.fit_data is not None and self.fit_data.genmc_loaded:
+            # generated MC opened by a later stage, whose columns may be cached too
+            return self.fit_data.genmc, self.fit_data.mass_columns(name)
+        dataset = ld.open(str(path))
+        return dataset, mass_columns(dataset)
+
+    def update_loading(self):
+        names = ', '.join(path.name for path in self.pending.values())
+        self.query_one('#loading_label', Label).update(
+            f'Loading {names}...' if names else ''
+        )
+        self.query_one('#loading').set_class(not self.pending, 'hidden')
+
+    def on_worker_state_changed(self, event: Worker.StateChanged):
+        name = event.worker.name
+        if name not in self.pending:
+            return
+        if event.state == WorkerState.ERROR:
+            path = self.pending.pop(name)
+            self.update_loading()
+            self.notify(f'Failed to open {path}: {event.worker.error}', severity='error')
+            return
+        if event.state != WorkerState.SUCCESS:
+            return
+        dataset, self.columns[name] = event.worker.result
+        del self.pending[name]
+        self.query_one('#loading', ProgressBar).advance(1)
+        self.update_loading()
+        if name == 'data':
+            self.data = dataset
+        elif name == 'accmc':
+            self.accmc = dataset
+            self.query_one('#show_accmc', RadioButton).disabled = False
+        else:
+            self.genmc = dataset
+            if self.fit_data is not None:
+                self.fit_data.genmc = dataset
+                self.fit_data.set_mass_columns(name, self.columns[name])
+        if name == self.shown_dataset():
+            self.query_one(Histogram).show(self.columns[name])
+        if self.fit_data is None and self.data is not None and self.accmc is not None:
+            self.fit_data = FitData(
+                self.data,
+                self.accmc,
+                self.genmc if self.genmc is not None else self.genmc_path,
+            )
+            self.fit_data.input_paths = (
+                self.data_path,
+                self.accmc_path,
+                self.genmc_path,
+            )
+            for key, columns in self.columns.items():
+                self.fit_data.set_mass_columns(key, columns)
+            self.query_one('#continue', Button).disabled = False
+
+    def shown_dataset(self) -> str:
+        return ('data', 'accmc', 'genmc')[self.query_one(RadioSet).pressed_index]
 
     def validate_lower(self, lower: str) -> bool:
         try:
@@ -124,13 +218,10 @@ class DataBinner(Screen):
 
     @on(RadioSet.Changed)
     def switch_dataset(self, event: RadioSet.Changed):
-        histogram = self.query_one(Histogram)
-        if event.index == 0:
-            histogram.data = self.data
-        elif event.index == 1:
-            histogram.data = self.accmc
-        else:
-            histogram.data = self.genmc
+        name = self.shown_dataset()
+        if name == 'genmc' and name not in self.columns and name not in self.pending:
+            self.load('genmc', self.genmc_path)
+        self.query_one(Histogram).show(self.columns.get(name))
 
     @on(Button.Pressed, '#back')
     def back_pressed(self):
@@ -139,6 +230,7 @@ class DataBinner(Screen):
 
     @on(Button.Pressed, '#continue')
     def continue_pressed(self):
+        assert self.fit_data is not None
         self.fit_data.bins = int(self.query_one('#bins', Input).value)
         self.fit_data.lower = float(self.query_one('#lower', Input).value)
         self.fit_data.upper = float(self.query_one('#upper', Input).value)
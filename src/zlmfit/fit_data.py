@@ -1,10 +1,56 @@
+import json
+from collections.abc import Callable
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 import laddu as ld
 import re
 import numpy as np
+import numpy.typing as npt
 from rich.rule import Rule
 
+from zlmfit.amplitudes import (
+    AmplitudeCache,
+    BatchNLL,
+    WaveProjector,
+    Yields,
+    zlm_values,
+)
+from zlmfit.cache import STAGE_KEYS, STAGE_OF_KEY, ResultCache
+from zlmfit.chains import (
+    BatchMeansAutocorrelation,
+    ChainBuffer,
+    ChainWriter,
+    StoredChain,
+)
+from zlmfit.columnar import write_columnar
+from zlmfit.optimize import MinimizeStatus, lbfgs
+from zlmfit.parallel import NLLSource, TaskPool
+from zlmfit.starts import unit_points
+from zlmfit.store import ResultStore
+
+
+# settings that only affect the stages after the fit
+BOOTSTRAP_SETTINGS = ('nboot', 'bootstrap_mode')
+MCMC_SETTINGS = (
+    'nwalkers',
+    'sigma',
+    'ntau',
+    'dtau',
+    'max_steps',
+    'thin',
+    'burn',
+    'chain_dtype',
+    'walker_init',
+    'streaming_tau',
+)
+# settings that only choose which earlier fits seed a refined binning
+REFINE_SETTINGS = ('refine_niters', 'coarse_bins')
+
+type ModelKey = tuple[
+    tuple['Wave', ...] | None, int | None, tuple['Wave', ...] | None, int | None
+]
+
 
 @dataclass(eq=True, frozen=True)
 class Wave:
@@ -31,12 +77,52 @@ class Wave:
 
         return Wave(int(g_l), convert(g_m), convert(g_r))
 
+    @staticmethod
+    def from_str(string: str) -> 'Wave':
+        m = re.fullmatch(r'(\d+)([+-]?\d+)([+-]1)', string.strip())
+        if m is None:
+            raise ValueError(f'Invalid wave {string!r} (expected e.g. "1-1+1")')
+        g_l, g_m, g_r = m.groups()
+        return Wave(int(g_l), int(g_m), int(g_r))
+
+    @staticmethod
+    def model_key(
+        pos_waves: list['Wave'] | None,
+        pos_anchor: int | None,
+        neg_waves: list['Wave'] | None,
+        neg_anchor: int | None,
+    ) -> ModelKey:
+        return (
+            tuple(pos_waves) if pos_waves is not None else None,
+            pos_anchor,
+            tuple(neg_waves) if neg_waves is not None else None,
+            neg_anchor,
+        )
+
     @staticmethod
     def get_model(
         pos_waves: list['Wave'] | None,
         pos_anchor: int | None,
         neg_waves: list['Wave'] | None,
         neg_anchor: int | None,
+    ) -> ld.Model:
+        key = Wave.model_key(pos_waves, pos_anchor, neg_waves, neg_anchor)
+        model = _MODEL_CACHE.get(key)
+        if model is None:
+            model = Wave.build_model(pos_waves, pos_anchor, neg_waves, neg_anchor)
+            _MODEL_CACHE[key] = model
+        return model
+
+    @staticmethod
+    def clear_model_cache():
+        _MODEL_CACHE.clear()
+
+    @staticmethod
+    def build_model(
+        pos_waves: list['Wave'] | None,
+        pos_anchor: int | None,
+        neg_waves: list['Wave'] | None,
+        neg_anchor: int | None,
     ) -> ld.Model:
         angles = ld.Angles(0, [1], [2], [2, 3])
         polarization = ld.Polarization(0, [1])
@@ -91,72 +177,339 @@ class Wave:
                 )
                 neg_out += amp * zlm
             if pos_waves is None:
-                return manager.model(pos_out.norm_sqr())  # type: ignore
+                return manager.model(neg_out.norm_sqr())  # type: ignore
 
         return manager.model(pos_out.norm_sqr() + neg_out.norm_sqr())  # type: ignore
 
 
+_MODEL_CACHE: dict[ModelKey, ld.Model] = {}
+
+
+@dataclass(eq=True, frozen=True)
+class WaveSet:
+    """
+    One choice of waves and anchors, as a candidate model of a wave-set scan.
+    """
+
+    pos_waves: tuple[Wave, ...] | None
+    pos_anchor: int | None
+    neg_waves: tuple[Wave, ...] | None
+    neg_anchor: int | None
+
+    def __str__(self) -> str:
+        # anchors are marked with a '*'
+        return ' '.join(
+            f'{wave}{"*" if i == anchor else ""}'
+            for waves, anchor in (
+                (self.pos_waves, self.pos_anchor),
+                (self.neg_waves, self.neg_anchor),
+            )
+            for i, wave in enumerate(waves or ())
+        )
+
+    @staticmethod
+    def union(wave_sets: list['WaveSet']) -> 'WaveSet':
+        """
+        Every wave of any of the sets (in order of appearance), anchored on the first.
+        """
+        pos_waves = tuple(
+            dict.fromkeys(wave for ws in wave_sets for wave in ws.pos_waves or ())
+        )
+        neg_waves = tuple(
+            dict.fromkeys(wave for ws in wave_sets for wave in ws.neg_waves or ())
+        )
+        return WaveSet(
+            pos_waves or None,
+            0 if pos_waves else None,
+            neg_waves or None,
+            0 if neg_waves else None,
+        )
+
+    def waves(self) -> list[Wave]:
+        return [*(self.pos_waves or ()), *(self.neg_waves or ())]
+
+    def model(self) -> ld.Model:
+        return Wave.get_model(
+            list(self.pos_waves) if self.pos_waves is not None else None,
+            self.pos_anchor,
+            list(self.neg_waves) if self.neg_waves is not None else None,
+            self.neg_anchor,
+        )
+
+    def parameters(self) -> list[str]:
+        return self.model().parameters
+
+
 class CustomMCMCObserver(ld.MCMCObserver):
     def __init__(
-        self, nll: ld.NLL, waves: list[Wave], ntau: int, dtau: float, discard: float = 0.5
+        self,
+        projector: WaveProjector,
+        waves: list[Wave],
+        ntau: int,
+        dtau: float,
+        discard: float = 0.5,
+        dtype: npt.DTypeLike = np.float64,
+        streaming_tau: bool = False,
+        verbose: bool = True,
+        burn: int = 0,
     ):
-        self.nll = nll
+        self.projector = projector
         self.waves = waves
         self.ntau = ntau
         self.dtau = dtau
         self.discard = discard
         self.latest_tau = np.inf
-        self.tot = []
-        self.projections = {wave: [] for wave in waves}
+        self.tot = ChainBuffer(dtype)  # (steps, walkers)
+        self.projections = ChainBuffer(dtype)  # (steps, walkers, waves)
+        self.batch_means = BatchMeansAutocorrelation() if streaming_tau else None
+        self.verbose = verbose
+        # never report convergence before the burn-in has been sampled
+        self.burn = burn
+        # steps sampled by earlier segments of the chain
+        self.offset = 0
+        self.converged = False
 
     def callback(self, step: int, ensemble: ld.Ensemble) -> tuple[ld.Ensemble, bool]:
-        print(f'MCMC step [red]{step}[/]')
-        latest_step = ensemble.get_chain()[:, -1, :]
-        tot = []
-        projections = {wave: [] for wave in self.waves}
-        for i_walker in range(ensemble.dimension[0]):
-            tot.append(np.sum(self.nll.project(latest_step[i_walker])))
-            for wave in self.waves:
-                projections[wave].append(
-                    np.sum(
-                        self.nll.project_with(
-                            latest_step[i_walker], [f'Z{wave}', f'{wave}']
-                        )
-                    )
-                )
-        self.tot.append(tot)
-        for wave in self.waves:
-            self.projections[wave].append(projections[wave])
+        step += self.offset
+        if self.verbose:
+            print(f'MCMC step [red]{step}[/]')
+        latest_step = ensemble.get_chain(burn=ensemble.dimension[1] - 1)[:, -1, :]
+        tot, projections = self.projector.project(latest_step)
+        if self.batch_means is not None:
+            self.batch_means.update(projections)
+        else:
+            self.tot.append(tot)
+            self.projections.append(projections)
         if step % self.ntau == 0:
-            chain = np.array([self.projections[wave] for wave in self.waves]).transpose(
-                2, 1, 0
-            )  # (walkers, steps, parameters)
-            chain = chain[
-                :,
-                min(
-                    int(step * self.discard),
-                    int(self.latest_tau * self.ntau)
-                    if np.isfinite(self.latest_tau)
-                    else int(step * self.discard),
-                ) :,
-            ]
-            taus = ld.integrated_autocorrelation_times(chain)
+            if self.batch_means is not None:
+                taus = self.batch_means.taus(self.discard)
+            else:
+                chain = self.projections.array.transpose(
+                    1, 0, 2
+                )  # (walkers, steps, waves)
+                chain = chain[
+                    :,
+                    min(
+                        int(step * self.discard),
+                        int(self.latest_tau * self.ntau)
+                        if np.isfinite(self.latest_tau)
+                        else int(step * self.discard),
+                    ) :,
+                ]
+                taus = ld.integrated_autocorrelation_times(chain)
             tau = np.mean(taus)
-            dtau = abs(self.latest_tau - tau) / tau
-            print(Rule('[blue]Checking Convergence[/]'))
-            print(f"τ = [{', '.join([str(t) for t in taus])}]")
-            print(f'τ̅ = {tau} (converges with τ̅ > {tau * self.ntau})')
-            print(f'Δτ/τ = {dtau} (converges with Δτ/τ < {self.dtau})')
-            converged = bool((tau * self.ntau < step) and (dtau < self.dtau))
+            # batch means report τ as infinite until the batches are long enough
+            if np.isfinite(tau) and np.isfinite(self.latest_tau):
+                dtau = abs(self.latest_tau - tau) / tau
+            else:
+                dtau = np.inf
+            if self.verbose:
+                print(Rule('[blue]Checking Convergence[/]'))
+                print(f"τ = [{', '.join([str(t) for t in taus])}]")
+                print(f'τ̅ = {tau} (converges with τ̅ > {tau * self.ntau})')
+                print(f'Δτ/τ = {dtau} (converges with Δτ/τ < {self.dtau})')
+            self.converged = bool(
+                (tau * self.ntau < step) and (dtau < self.dtau) and step > self.burn
+            )
             self.latest_tau = tau
-            return (ensemble, converged)
+            return (ensemble, self.converged)
 
         return (ensemble, False)
 
 
+@dataclass(frozen=True)
+class SamplerSettings:
+    max_steps: int
+    segment_steps: int
+    thin: int
+    burn: int
+    dtype: str
+    ntau: int
+    dtau: float
+    streaming_tau: bool
+    seed: int
+    verbose: bool
+
+
 type FitResult = dict[int, ld.Status]
 type BootstrapResult = dict[int, list[ld.Status]]
-type MCMCResult = dict[int, tuple[ld.Ensemble, float]]
+type MCMCResult = dict[int, StoredChain]
+type FitProgress = Callable[[int, int, ld.Status], None]
+type MCMCProgress = Callable[[int, StoredChain], None]
+type ScanResult = dict[int, dict[int, MinimizeStatus]]
+type ScanProgress = Callable[[int, int, MinimizeStatus], None]
+
+
+def restart_rng(seed: int, ibin: int, iiter: int) -> np.random.Generator:
+    # each (bin, restart) pair gets its own stream so results do not depend on the
+    # order in which tasks are run
+    return np.random.default_rng((seed, ibin, iiter))
+
+
+def fit_restart(
+    source: NLLSource, ibin: int, istart: int, x0: np.ndarray
+) -> tuple[int, int, ld.Status]:
+    return ibin, istart, source.get_nll(ibin).minimize(x0)
+
+
+def fit_restart_fast(
+    source: NLLSource, ibin: int, istart: int, x0: np.ndarray, waves: list['Wave']
+) -> tuple[int, int, MinimizeStatus]:
+    return ibin, istart, lbfgs(source.get_fast_nll(ibin, waves).value_and_gradient, x0)
+
+
+def fit_bootstrap(
+    source: NLLSource, ibin: int, iboot: int, x0: np.ndarray
+) -> tuple[int, int, ld.Status]:
+    return ibin, iboot, source.get_nll(ibin, bootstrap=iboot).minimize(x0)
+
+
+BOOTSTRAP_MODES = ('resample', 'poisson', 'multinomial')
+WALKER_INITS = ('ball', 'covariance')
+
+
+def bootstrap_counts(mode: str, seed: int, ibin: int, iboot: int, n: int) -> np.ndarray:
+    """
+    How often each event appears in a bootstrap replica: multinomial counts are
+    equivalent to resampling n events with replacement, and independent Poisson(1)
+    counts approximate them for large n.
+    """
+    rng = np.random.default_rng((seed, ibin, iboot, 1))
+    if mode == 'poisson':
+        return rng.poisson(1.0, size=n).astype(np.float64)
+    if mode == 'multinomial':
+        return rng.multinomial(n, np.full(n, 1.0 / n)).astype(np.float64)
+    raise ValueError(f'Bootstrap mode {mode!r} does not use event counts!')
+
+
+def fit_bootstrap_weighted(
+    source: NLLSource,
+    ibin: int,
+    iboot: int,
+    x0: np.ndarray,
+    waves: list['Wave'],
+    mode: str,
+    seed: int,
+) -> tuple[int, int, MinimizeStatus]:
+    fast_nll = source.get_fast_nll(ibin, waves)
+    counts = bootstrap_counts(mode, seed, ibin, iboot, len(fast_nll.weights))
+    return ibin, iboot, lbfgs(fast_nll.reweighted(counts).value_and_gradient, x0)
+
+
+def fit_wave_set(
+    source: NLLSource,
+    ibin: int,
+    iset: int,
+    istart: int,
+    x0: np.ndarray,
+    union: list[Wave],
+    waves: list[Wave],
+    parameters: list[str],
+) -> tuple[int, int, int, MinimizeStatus]:
+    nll = source.get_wave_set_nll(ibin, union, waves, parameters)
+    return ibin, iset, istart, lbfgs(nll.value_and_gradient, x0)
+
+
+def sample_bin(
+    source: NLLSource,
+    ibin: int,
+    p0: np.ndarray,
+    waves: list[Wave],
+    parameters: list[str],
+    settings: SamplerSettings,
+    directory: Path,
+) -> tuple[int, StoredChain]:
+    """
+    Samples a bin in segments of `segment_steps`, each continuing from the last
+    positions of the previous one, writing every segment to ``directory`` as soon as
+    it is produced. Stops at `max_steps` or once the observer reports convergence.
+
+    Every segment uses the same fixed ESS step scale (laddu's default ``mu``), so the
+    chain is sampled exactly as by a single unsegmented call with ``n_adaptive=0``.
+    laddu does not return the scale its adaptive phase settles on, so it could not be
+    carried over between segments, and on our posteriors that scale can cost two
+    orders of magnitude more likelihood evaluations per step (see
+    benchmarks/chain_segments.py).
+    """
+    nll = source.get_nll(ibin)
+    observer = CustomMCMCObserver(
+        source.get_projector(ibin, waves, parameters),
+        waves,
+        settings.ntau,
+        settings.dtau,
+        dtype=settings.dtype,
+        streaming_tau=settings.streaming_tau,
+        verbose=settings.verbose,
+        burn=settings.burn,
+    )
+    writer = ChainWriter(
+        directory, thin=settings.thin, burn=settings.burn, dtype=settings.dtype
+    )
+    positions = p0
+    segment = 0
+    while writer.steps < settings.max_steps and not observer.converged:
+        # a chain includes its starting positions, which the previous segment ended on
+        first = segment == 0
+        nsteps = min(settings.segment_steps, settings.max_steps - writer.steps)
+        observer.offset = max(writer.steps - 1, 0)
+        ensemble = nll.mcmc(
+            positions,
+            nsteps if first else nsteps + 1,
+            observers=[observer],
+            seed=int(
+                np.random.default_rng((settings.seed, ibin, segment)).integers(2**31)
+            ),
+            n_adaptive=0,
+        )
+        chain = ensemble.get_chain()
+        writer.write(chain if first else chain[:, 1:])
+        positions = chain[:, -1, :]
+        segment += 1
+    return ibin, writer.finish(observer.latest_tau, observer.converged)
+
+
+def mass_columns(dataset: ld.Dataset) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The invariant mass of particles 2 and 3 (the binning variable) and the weight of
+    every event of a dataset, as contiguous arrays.
+    """
+    return (
+        np.ascontiguousarray(ld.Mass([2, 3]).value_on(dataset), dtype=np.float64),
+        np.ascontiguousarray(dataset.weights, dtype=np.float64),
+    )
+
+
+def covariance_factor(covariance: np.ndarray | None) -> np.ndarray | None:
+    """
+    The Cholesky factor of a covariance matrix, or None if it is missing or not
+    positive definite (as happens when a fit ends on a flat direction).
+    """
+    if covariance is None or not np.all(np.isfinite(covariance)):
+        return None
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        return None
+
+
+def best_index(statuses: dict[int, ld.Status]) -> int:
+    best = None
+    best_nll = np.inf
+    for iiter in sorted(statuses):
+        if statuses[iiter].fx < best_nll:
+            best = iiter
+            best_nll = statuses[iiter].fx
+    assert best is not None
+    return best
+
+
+def best_status(statuses: dict[int, ld.Status]) -> ld.Status:
+    return statuses[best_index(statuses)]
+
+
+def reproductions(statuses: dict[int, ld.Status], tolerance: float) -> int:
+    best_nll = min(status.fx for status in statuses.values())
+    return sum(status.fx - best_nll <= tolerance for status in statuses.values())
 
 
 class FitData:
@@ -164,14 +517,19 @@ class FitData:
         self,
         data: ld.Dataset,
         accmc: ld.Dataset,
-        genmc: ld.Dataset,
+        genmc: ld.Dataset | Path,
     ):
         self.data: ld.Dataset = data
         self.accmc: ld.Dataset = accmc
-        self.genmc: ld.Dataset = genmc
+        # generated MC is usually the largest file but only binned for acceptance
+        # corrected yields, so a path is opened the first time it is needed
+        self._genmc: ld.Dataset | None = None if isinstance(genmc, Path) else genmc
+        self.genmc_path: Path | None = genmc if isinstance(genmc, Path) else None
         self._binned_data: ld.BinnedDataset | None = None
         self._binned_accmc: ld.BinnedDataset | None = None
         self._binned_genmc: ld.BinnedDataset | None = None
+        self._mass_columns: dict[str, tuple[ld.Dataset, np.ndarray, np.ndarray]] = {}
+        self._binnings: dict[str, tuple] = {}
         self._output_path: Path | None = None
         self._bins: int | None = None
         self._lower: float | None = None
@@ -181,13 +539,63 @@ class FitData:
         self.neg_waves: list[Wave] | None = None
         self.neg_anchor: int | None = None
         self._niters: int | None = None
+        self.bin_subset: list[int] | None = None
+        self.warm_start: bool = False
+        self.anchor_bin: int = 0
+        self.warm_niters: int = 2
+        self.adaptive: bool = False
+        self.nreproduce: int = 3
+        self.reproduce_tol: float = 1e-3
+        self.start_method: str = 'uniform'
+        self.scale_starts: bool = False
+        self.prescreen: int = 0
+        self.fast_likelihood: bool = False
+        self.fit_starts: dict[int, int] = {}
+        self.refine: bool = False
+        self.refine_niters: int = 2
+        self.coarse_bins: list[int] = []
+        self.fit_history: dict[
+            str, dict[tuple[float, float], tuple[ld.Status, float]]
+        ] = {}
+        self.workers: int = 1
+        self.seed: int = 0
         self.bootstrap: bool = False
         self._nboot: int | None = None
+        self.bootstrap_mode: str = 'resample'
+        self.wave_sets: list[WaveSet] | None = None
         self.mcmc: bool = False
         self._nwalkers: int | None = None
         self._sigma: float | None = None
         self._ntau: int | None = None
         self._dtau: float | None = None
+        self.chain_dtype: npt.DTypeLike = np.float64
+        self.max_steps: int = 3000
+        self.segment_steps: int = 500
+        self.thin: int = 1
+        self.burn: int = 0
+        self.streaming_tau: bool = False
+        self.walker_init = 'ball'
+        self.store: ResultStore | None = None
+        self.input_paths: tuple[Path, Path, Path] | None = None
+        self.result_cache: ResultCache | None = None
+        self.amplitudes = AmplitudeCache()
+        self._projectors: dict[tuple, WaveProjector] = {}
+
+    def set_waves(
+        self,
+        pos_waves: list[Wave] | None,
+        pos_anchor: int | None,
+        neg_waves: list[Wave] | None,
+        neg_anchor: int | None,
+    ):
+        if Wave.model_key(
+            self.pos_waves, self.pos_anchor, self.neg_waves, self.neg_anchor
+        ) != Wave.model_key(pos_waves, pos_anchor, neg_waves, neg_anchor):
+            Wave.clear_model_cache()
+        self.pos_waves = pos_waves
+        self.pos_anchor = pos_anchor
+        self.neg_waves = neg_waves
+        self.neg_anchor = neg_anchor
 
     @property
     def binned_data(self) -> ld.BinnedDataset:
@@ -201,6 +609,21 @@ class FitData:
             return self._binned_accmc
         raise AttributeError('Accepted MC has not been binned yet!')
 
+    @property
+    def genmc(self) -> ld.Dataset:
+        if self._genmc is None:
+            assert self.genmc_path is not None
+            self._genmc = ld.open(str(self.genmc_path))
+        return self._genmc
+
+    @genmc.setter
+    def genmc(self, new_genmc: ld.Dataset):
+        self._genmc = new_genmc
+
+    @property
+    def genmc_loaded(self) -> bool:
+        return self._genmc is not None
+
     @property
     def binned_genmc(self) -> ld.BinnedDataset:
         if self._binned_genmc is not None:
@@ -307,6 +730,170 @@ class FitData:
     def dtau(self, new_dtau: float):
         self._dtau = new_dtau
 
+    def config(self) -> dict[str, Any]:
+        config: dict[str, Any] = {
+            'bins': self.bins,
+            'lower': self.lower,
+            'upper': self.upper,
+            'pos_waves': [str(wave) for wave in self.pos_waves or []],
+            'pos_anchor': self.pos_anchor,
+            'neg_waves': [str(wave) for wave in self.neg_waves or []],
+            'neg_anchor': self.neg_anchor,
+            'niters': self.niters,
+            'seed': self.seed,
+        }
+        if self.warm_start:
+            config['anchor_bin'] = self.anchor_bin
+            config['warm_niters'] = self.warm_niters
+        if self.start_method != 'uniform' or self.scale_starts:
+            config['start_method'] = self.start_method
+            config['scale_starts'] = self.scale_starts
+        if self.prescreen:
+            config['prescreen'] = self.prescreen
+        if self.refine:
+            config['refine_niters'] = self.refine_niters
+            config['coarse_bins'] = self.coarse_bins
+        if self.fast_likelihood:
+            config['fast_likelihood'] = True
+        if self.adaptive:
+            config['nreproduce'] = self.nreproduce
+            config['reproduce_tol'] = self.reproduce_tol
+        if self.wave_sets is not None:
+            config['scan'] = [str(wave_set) for wave_set in self.wave_sets]
+        if self.bootstrap:
+            config['nboot'] = self.nboot
+            if self.bootstrap_mode != 'resample':
+                config['bootstrap_mode'] = self.bootstrap_mode
+        if self.mcmc:
+            config['nwalkers'] = self.nwalkers
+            config['sigma'] = self.sigma
+            config['ntau'] = self.ntau
+            config['dtau'] = self.dtau
+            if self.max_steps != 3000:
+                config['max_steps'] = self.max_steps
+            if self.thin != 1 or self.burn != 0:
+                config['thin'] = self.thin
+                config['burn'] = self.burn
+            if np.dtype(self.chain_dtype) != np.float64:
+                config['chain_dtype'] = np.dtype(self.chain_dtype).name
+            if self.walker_init != 'ball':
+                config['walker_init'] = self.walker_init
+            if self.streaming_tau:
+                config['streaming_tau'] = True
+        return config
+
+    def open_store(self) -> ResultStore:
+        store = ResultStore(self.output_path)
+        store.open()
+        config = store.metadata('config')
+        if config is None:
+            store.append('config', None, self.config())
+        elif config != self.config():
+            store.close()
+            raise ValueError(
+                f'{self.output_path} was written with a different configuration!'
+            )
+        self.store = store
+        return store
+
+    def stage_settings(self, stage: str) -> dict[str, Any]:
+        """
+        The settings that determine the results of a stage ('fit', 'scan', 'bootstrap'
+        or 'mcmc'). Later stages include the fit settings, since they start from the
+        fit.
+        """
+        config = self.config()
+        stage_settings = {'bootstrap': BOOTSTRAP_SETTINGS, 'mcmc': MCMC_SETTINGS}
+        settings = {
+            key: value
+            for key, value in config.items()
+            if key not in BOOTSTRAP_SETTINGS + MCMC_SETTINGS
+        }
+        if stage in stage_settings:
+            settings[stage] = {
+                key: config[key] for key in stage_settings[stage] if key in config
+            }
+        if stage == 'mcmc':
+            # walkers may start from the spread of the bootstrap fits
+            if self.walker_init == 'covariance' and self.bootstrap:
+                settings['bootstrap'] = {
+                    key: config[key] for key in BOOTSTRAP_SETTINGS if key in config
+                }
+        return settings
+
+    def cache_key(self, stage: str) -> str | None:
+        """
+        The `ResultCache` key of a stage's results, or None if results are not cached
+        (which needs the paths of the input files).
+        """
+        if self.result_cache is None or self.input_paths is None:
+            return None
+        return ResultCache.key(
+            self.result_cache.input_digests(self.input_paths), self.stage_settings(stage)
+        )
+
+    def completed(self, key: str) -> dict[int, Any]:
+        """
+        Results already recorded in the store, plus those of any other selected bin
+        found in the result cache (which are copied into the store).
+        """
+        out = self.store.results(key) if self.store is not None else {}
+        stage = STAGE_OF_KEY.get(key)
+        if stage is None or STAGE_KEYS[stage][0] != key:
+            return out
+        cache_key = self.cache_key(stage)
+        if cache_key is None or self.result_cache is None:
+            return out
+        for ibin in self.selected_bins():
+            if ibin in out:
+                continue
+            data = self.result_cache.get(cache_key, key, ibin)
+            if data is None:
+                continue
+            if isinstance(data, StoredChain):
+                # the cached copy can be evicted, so every run gets a chain of its own
+                if not data.available():
+                    continue
+                data = data.copy_to(self.chain_directory(ibin))
+            out[ibin] = data
+            if self.store is not None:
+                self.store.append(key, ibin, data)
+                for companion in STAGE_KEYS[stage][1:]:
+                    companion_data = self.result_cache.get(cache_key, companion, ibin)
+                    if companion_data is not None:
+                        self.store.append(companion, ibin, companion_data)
+        return out
+
+    def checkpoint(self, key: str, ibin: int, data: Any):
+        if self.store is not None:
+            self.store.append(key, ibin, data)
+        if key in STAGE_OF_KEY and self.result_cache is not None:
+            cache_key = self.cache_key(STAGE_OF_KEY[key])
+            if cache_key is not None:
+                self.result_cache.put(cache_key, key, ibin, data)
+
+    def sync_store(self):
+        if self.store is not None:
+            self.store.sync()
+
+    def export_columnar(self) -> Path:
+        assert self.store is not None
+        path = self.output_path.with_suffix('.zlmcol')
+        write_columnar(
+            path,
+            self.store.load(),
+            parameters=Wave.get_model(
+                self.pos_waves, self.pos_anchor, self.neg_waves, self.neg_anchor
+            ).parameters,
+            config=self.config(),
+        )
+        return path
+
+    def selected_bins(self) -> list[int]:
+        if self.bin_subset is not None:
+            return sorted(self.bin_subset)
+        return list(range(self.bins))
+
     def get_nll(self, ibin: int, *, bootstrap: int | None = None) -> ld.NLL:
         assert self.binned_data is not None
         assert self.binned_accmc is not None
@@ -321,7 +908,7 @@ class FitData:
             )
         return ld.NLL(model, self.binned_data[ibin], self.binned_accmc[ibin])
 
-    def get_mcmc_observer(self, ibin: int) -> CustomMCMCObserver:
+    def waves(self) -> list[Wave]:
         waves = (
             self.pos_waves + self.neg_waves
             if self.pos_waves and self.neg_waves
@@ -330,13 +917,125 @@ class FitData:
             else self.neg_waves
         )
         assert waves is not None
-        assert self.ntau is not None
-        assert self.dtau is not None
-        return CustomMCMCObserver(
-            self.get_nll(ibin),
-            waves,
-            self.ntau,
-            self.dtau,
+        return waves
+
+    def yields(
+        self, ibin: int, parameters: np.ndarray, *, acceptance_corrected: bool = True
+    ) -> Yields:
+        """
+        Yields of every wave (and every interference term) for an (n, parameters)
+        array such as bootstrap fits or chain draws. Acceptance-corrected yields
+        integrate the model over the generated MC, Σ_genmc w I / N_accmc, which assumes
+        the accepted MC was selected from the generated MC.
+        """
+        if acceptance_corrected and self._binned_genmc is None:
+            self._binned_genmc = self.genmc.bin_by(
+                ld.Mass([2, 3]), self.bins, (self.lower, self.upper)
+            )
+        name = 'genmc' if acceptance_corrected else 'accmc'
+        key = (name, ibin, tuple(self.waves()))
+        projector = self._projectors.get(key)
+        if projector is None:
+            projector = self._projectors[key] = WaveProjector(
+                self.waves(),
+                self.parameters(),
+                self.binned_dataset(name)[ibin],
+                len(self.binned_accmc[ibin]),
+                values=self.zlm_values(name, ibin),
+            )
+        return Yields(projector.waves, projector.terms(parameters))
+
+    def parameters(self) -> list[str]:
+        return Wave.get_model(
+            self.pos_waves, self.pos_anchor, self.neg_waves, self.neg_anchor
+        ).parameters
+
+    def binned_dataset(self, name: str) -> ld.BinnedDataset:
+        return getattr(self, f'binned_{name}')
+
+    def zlm_values(
+        self, name: str, ibin: int, waves: list[Wave] | None = None
+    ) -> np.ndarray:
+        """
+        Zlm values of every wave (of the fit, unless other ``waves`` are given) for
+        each event of a binned dataset ('data', 'accmc' or 'genmc'), computed once and
+        kept in `amplitudes` until evicted or rebinned.
+        """
+        if waves is None:
+            waves = self.waves()
+        return self.amplitudes.get(
+            (name, ibin, tuple(waves)),
+            lambda: zlm_values(waves, self.binned_dataset(name)[ibin]),
+        )
+
+    def mass_columns(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The mass and weight columns of a dataset ('data', 'accmc' or 'genmc'), computed
+        once per dataset and shared by every binning and histogram.
+        """
+        dataset = getattr(self, name)
+        cached = self._mass_columns.get(name)
+        if cached is None or cached[0] is not dataset:
+            cached = (dataset, *mass_columns(dataset))
+            self._mass_columns[name] = cached
+        return cached[1], cached[2]
+
+    def set_mass_columns(self, name: str, columns: tuple[np.ndarray, np.ndarray]):
+        """
+        Stores `mass_columns` that were already computed for the current dataset.
+        """
+        self._mass_columns[name] = (getattr(self, name), *columns)
+
+    def _binning(self, name: str) -> tuple:
+        # summing the binned datasets avoids evaluating the mass column in headless
+        # runs, where no histogram needs it
+        binning = (self.bins, self.lower, self.upper)
+        binned = {
+            'data': self._binned_data,
+            'accmc': self._binned_accmc,
+            'genmc': self._binned_genmc,
+        }[name]
+        use_binned = (
+            name not in self._mass_columns
+            and binned is not None
+            and (binned.bins, *binned.range) == binning
+        )
+        source = binned if use_binned else self.mass_columns(name)[0]
+        cached = self._binnings.get(name)
+        if cached is None or cached[0] is not source or cached[1] != binning:
+            if use_binned:
+                assert binned is not None
+                counts = np.array([binned[ibin].len() for ibin in range(self.bins)])
+                totals = np.array(
+                    [binned[ibin].weighted_len() for ibin in range(self.bins)]
+                )
+            else:
+                mass, weights = self.mass_columns(name)
+                edges = np.linspace(self.lower, self.upper, self.bins + 1)
+                indices = np.searchsorted(edges, mass, side='right') - 1
+                inside = (mass >= self.lower) & (mass < self.upper)
+                counts = np.bincount(indices[inside], minlength=self.bins)
+                totals = np.bincount(
+                    indices[inside], weights=weights[inside], minlength=self.bins
+                )
+            cached = (source, binning, counts, totals)
+            self._binnings[name] = cached
+        return cached
+
+    def bin_counts(self, name: str = 'data') -> np.ndarray:
+        return self._binning(name)[2]
+
+    def bin_weights(self, name: str = 'data') -> np.ndarray:
+        return self._binning(name)[3]
+
+    def get_batch_nll(self, ibin: int) -> BatchNLL:
+        return BatchNLL(
+            self.waves(),
+            self.parameters(),
+            self.binned_data[ibin],
+            self.binned_accmc[ibin],
+            data_values=self.zlm_values('data', ibin),
+            accmc_values=self.zlm_values('accmc', ibin),
         )
 
     def bin_datasets(self, *, bin_generated: bool = False):
@@ -344,55 +1043,501 @@ class FitData:
         assert self.lower is not None
         assert self.upper is not None
         mass = ld.Mass([2, 3])
+        self.amplitudes.clear()
+        self._projectors = {}
         self._binned_data = self.data.bin_by(mass, self.bins, (self.lower, self.upper))
         self._binned_accmc = self.accmc.bin_by(mass, self.bins, (self.lower, self.upper))
-        if bin_generated:
-            self._binned_genmc = self.genmc.bin_by(
-                mass, self.bins, (self.lower, self.upper)
+        self._binned_genmc = (
+            self.genmc.bin_by(mass, self.bins, (self.lower, self.upper))
+            if bin_generated
+            else None
+        )
+
+    def task_pool(self) -> TaskPool:
+        return TaskPool(
+            Wave.get_model(
+                self.pos_waves, self.pos_anchor, self.neg_waves, self.neg_anchor
+            ),
+            {'data': self.binned_data, 'accmc': self.binned_accmc},
+            self.workers,
+            values=self.zlm_values,
+            bins=self.selected_bins(),
+        )
+
+    def wave_set(self) -> WaveSet:
+        return WaveSet(
+            tuple(self.pos_waves) if self.pos_waves is not None else None,
+            self.pos_anchor,
+            tuple(self.neg_waves) if self.neg_waves is not None else None,
+            self.neg_anchor,
+        )
+
+    def start_bounds(
+        self, ibin: int, wave_set: WaveSet | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if wave_set is None:
+            wave_set = self.wave_set()
+        parameters = wave_set.parameters()
+        if not self.scale_starts:
+            return np.full(len(parameters), -100.0), np.full(len(parameters), 100.0)
+        # a single wave holding every event of the bin has |c| ~ sqrt(4π N)
+        scale = np.sqrt(4.0 * np.pi * self.bin_weights()[ibin])
+        lower = np.full(len(parameters), -scale)
+        upper = np.full(len(parameters), scale)
+        # flipping the sign of every amplitude in a reflectivity leaves the NLL
+        # unchanged, so only positive anchors need to be searched
+        for waves, anchor in (
+            (wave_set.pos_waves, wave_set.pos_anchor),
+            (wave_set.neg_waves, wave_set.neg_anchor),
+        ):
+            if waves is not None and anchor is not None:
+                lower[parameters.index(f'{waves[anchor]} real')] = 0.0
+        return lower, upper
+
+    def start_points(
+        self, ibin: int, n: int, wave_set: WaveSet | None = None
+    ) -> np.ndarray:
+        lower, upper = self.start_bounds(ibin, wave_set)
+        if self.start_method == 'uniform':
+            return np.array(
+                [
+                    restart_rng(self.seed, ibin, iiter).uniform(lower, upper)
+                    for iiter in range(n)
+                ]
             )
+        points = unit_points(
+            self.start_method, n, len(lower), np.random.default_rng((self.seed, ibin))
+        )
+        return lower + (upper - lower) * points
+
+    def bin_edges(self, ibin: int) -> tuple[float, float]:
+        edges = np.linspace(self.lower, self.upper, self.bins + 1)
+        return round(float(edges[ibin]), 12), round(float(edges[ibin + 1]), 12)
+
+    def history(self) -> dict[tuple[float, float], tuple[ld.Status, float]]:
+        """
+        Best fits of every binning fit so far in this session with the current fit
+        settings, by bin edges, along with the summed data weight of each bin.
+        """
+        settings = {
+            key: value
+            for key, value in self.stage_settings('fit').items()
+            if key not in ('bins', 'lower', 'upper', *REFINE_SETTINGS)
+        }
+        return self.fit_history.setdefault(json.dumps(settings, sort_keys=True), {})
 
-    def run_fit(self) -> FitResult:
-        out = {}
+    def overlapping_fits(self, ibin: int, n: int = 3) -> list[tuple[tuple, np.ndarray]]:
+        """
+        Up to ``n`` earlier fits of the bins overlapping the given bin the most, with
+        their parameters rescaled to the number of events in this bin (the intensity
+        is proportional to the event count, so amplitudes scale with its square root).
+        """
+        lower, upper = self.bin_edges(ibin)
+        weight = float(self.bin_weights()[ibin])
+        overlaps = []
+        for edges, (status, old_weight) in self.history().items():
+            overlap = min(upper, edges[1]) - max(lower, edges[0])
+            if overlap > 0.0 and old_weight > 0.0:
+                overlaps.append(
+                    (-overlap, edges[1] - edges[0], edges, status.x, old_weight)
+                )
+        return [
+            (edges, np.asarray(x) * np.sqrt(weight / old_weight))
+            for *_, edges, x, old_weight in sorted(overlaps, key=lambda o: o[:3])[:n]
+        ]
+
+    def record_history(self, fit_results: FitResult):
+        history = self.history()
+        for ibin, status in fit_results.items():
+            history[self.bin_edges(ibin)] = (status, float(self.bin_weights()[ibin]))
+
+    def fit_coarse(self):
+        """
+        Fits each binning of `coarse_bins` (over the same range) that has not been fit
+        yet, only to record the results in `fit_history` for seeding finer bins.
+        """
+        saved = (
+            self._bins,
+            self._binned_data,
+            self._binned_accmc,
+            self._binned_genmc,
+            self.store,
+            self.result_cache,
+            self.bin_subset,
+            self.coarse_bins,
+            self.fit_starts,
+        )
+        try:
+            for bins in self.coarse_bins:
+                self._bins = bins
+                if all(self.bin_edges(ibin) in self.history() for ibin in range(bins)):
+                    continue
+                self.store = None
+                self.result_cache = None
+                self.bin_subset = None
+                self.coarse_bins = []
+                self.fit_starts = {}
+                self.bin_datasets()
+                self.run_fit()
+        finally:
+            (
+                self._bins,
+                self._binned_data,
+                self._binned_accmc,
+                self._binned_genmc,
+                self.store,
+                self.result_cache,
+                self.bin_subset,
+                self.coarse_bins,
+                self.fit_starts,
+            ) = saved
+            self.amplitudes.clear()
+            self._projectors = {}
+
+    def fit_parent(self, ibin: int) -> int | None:
+        if ibin == self.anchor_bin:
+            return None
+        return ibin - 1 if ibin > self.anchor_bin else ibin + 1
+
+    def run_fit(self, progress: FitProgress | None = None) -> FitResult:
+        """
+        Fits every selected bin from `niters` random starting points. With
+        `warm_start`, bins are instead fit outward from `anchor_bin`: each bin starts
+        from the best fits of its already fitted neighbours plus `warm_niters` random
+        points, and only bins with no fitted neighbour to continue from get the full
+        `niters` random starts.
+
+        With `prescreen`, that many random candidates are drawn per bin and split
+        into groups, and only the candidate with the lowest NLL in each group
+        (evaluated in bulk by `BatchNLL`) is minimized.
+
+        With `fast_likelihood`, starts are minimized with `lbfgs` on a `FastNLL`, whose
+        normalization uses the precomputed accepted-MC integrals of every pair of
+        waves. Only the best start of each bin is then polished with `NLL.minimize`,
+        which also provides the uncertainties.
+
+        With `adaptive`, starts are only run until the best NLL of a bin has been
+        found `nreproduce` times (within `reproduce_tol`), so `fit_starts` holds
+        the number of starts actually spent once a bin is complete.
+
+        With `refine`, the binnings of `coarse_bins` are fit first, and bins whose
+        edges match a bin fit earlier in this session (with the same settings) reuse
+        that fit. Other bins start from the fits of the earlier bins they overlap most
+        plus `refine_niters` random points.
+        """
         assert self.bins is not None
         assert self.niters is not None
-        rng = np.random.default_rng(0)
-        for ibin in range(self.bins):
-            nll = self.get_nll(ibin)
-            best_fit = None
-            best_nll = np.inf
-            for _ in range(self.niters):
-                p0 = rng.uniform(-100.0, 100.0, size=len(nll.parameters))
-                fit_result = nll.minimize(p0)
-                if fit_result.fx < best_nll:
-                    best_fit = fit_result
-                    best_nll = fit_result.fx
-            assert best_fit is not None
-            out[ibin] = best_fit
-        return out
+        if self.refine and self.coarse_bins:
+            self.fit_coarse()
+        out: FitResult = self.completed('fit_result')
+        if self.refine:
+            history = self.history()
+            for ibin in self.selected_bins():
+                if ibin not in out and self.bin_edges(ibin) in history:
+                    out[ibin] = history[self.bin_edges(ibin)][0]
+                    self.fit_starts[ibin] = 0
+                    self.checkpoint('fit_result', ibin, out[ibin])
+                    self.checkpoint('fit_origin', ibin, {'start': 'reused', 'nstarts': 0})
+        bins = [ibin for ibin in self.selected_bins() if ibin not in out]
+        restarts: dict[int, dict[int, ld.Status | MinimizeStatus]] = {
+            ibin: {} for ibin in bins
+        }
+        origins: dict[int, list[dict[str, Any]]] = {}
+        polish: dict[int, tuple[int, dict[str, Any]]] = {}
+        launched: dict[int, int] = {}
+        extra_args = (self.waves(),) if self.fast_likelihood else ()
+        points: dict[int, np.ndarray] = {}
+        seeds: dict[int, list[np.ndarray]] = {}
+
+        def start_point(ibin: int, origin: dict[str, Any]) -> np.ndarray:
+            if origin['start'] == 'neighbour':
+                return out[origin['bin']].x
+            if origin['start'] == 'overlap':
+                return seeds[ibin][origin['seed']]
+            return points[ibin][origin['restart']]
+
+        def launch(ibin: int, n: int) -> list[tuple]:
+            start = launched[ibin]
+            launched[ibin] = min(start + n, len(origins[ibin]))
+            return [
+                (ibin, istart, start_point(ibin, origin), *extra_args)
+                for istart, origin in enumerate(
+                    origins[ibin][start : launched[ibin]], start
+                )
+            ]
+
+        def schedule(ibin: int) -> list[tuple]:
+            nrandom = self.niters
+            neighbours = []
+            if self.warm_start and self.fit_parent(ibin) in out:
+                nrandom = min(self.warm_niters, self.niters)
+                neighbours = [jbin for jbin in (ibin - 1, ibin + 1) if jbin in out]
+            overlaps = self.overlapping_fits(ibin) if self.refine else []
+            if overlaps:
+                nrandom = min(self.refine_niters, nrandom)
+            seeds[ibin] = [x for _, x in overlaps]
+            restarts_used = np.arange(nrandom)
+            # with no random starts left (warm or refined bins) there is nothing to screen
+            ncandidates = max(nrandom, self.prescreen) if nrandom else 0
+            points[ibin] = self.start_points(ibin, ncandidates)
+            if ncandidates > nrandom:
+                # minimize from the best candidate of each of nrandom equal groups, since
+                # the overall best candidates tend to share a basin
+                values = self.get_batch_nll(ibin).evaluate(points[ibin])
+                groups = np.array_split(np.arange(len(values)), nrandom)
+                restarts_used = np.array(
+                    [group[np.argmin(values[group])] for group in groups]
+                )
+            origins[ibin] = (
+                [{'start': 'neighbour', 'bin': jbin} for jbin in neighbours]
+                + [
+                    {'start': 'overlap', 'lower': edges[0], 'upper': edges[1], 'seed': i}
+                    for i, (edges, _) in enumerate(overlaps)
+                ]
+                + [{'start': 'random', 'restart': int(iiter)} for iiter in restarts_used]
+            )
+            self.fit_starts[ibin] = len(origins[ibin])
+            launched[ibin] = 0
+            return launch(ibin, self.nreproduce if self.adaptive else len(origins[ibin]))
+
+        def finished(ibin: int) -> bool:
+            if len(restarts[ibin]) < launched[ibin]:
+                return False
+            return launched[ibin] == len(origins[ibin]) or (
+                self.adaptive
+                and reproductions(restarts[ibin], self.reproduce_tol) >= self.nreproduce
+            )
+
+        def waiting(ibin: int) -> bool:
+            return self.warm_start and self.fit_parent(ibin) in restarts
+
+        def then(result: tuple[int, int, ld.Status]) -> list[tuple]:
+            ibin = result[0]
+            if ibin not in out:
+                if self.adaptive and len(restarts[ibin]) == launched[ibin]:
+                    return launch(ibin, 1)
+                return []
+            return [
+                task
+                for child in bins
+                if child not in origins and self.fit_parent(child) == ibin
+                for task in schedule(child)
+            ]
 
-    def run_bootstrap(self, fit_results: FitResult) -> BootstrapResult:
-        out = {ibin: [] for ibin in fit_results.keys()}
+        tasks = [task for ibin in bins if not waiting(ibin) for task in schedule(ibin)]
+        task = fit_restart_fast if self.fast_likelihood else fit_restart
+        with self.task_pool() as pool:
+            for ibin, istart, status in pool.run(task, tasks, then):
+                restarts[ibin][istart] = status
+                if finished(ibin):
+                    best = best_index(restarts[ibin])  # type: ignore
+                    out[ibin] = restarts[ibin][best]  # type: ignore
+                    self.fit_starts[ibin] = len(restarts[ibin])
+                    origin = origins[ibin][best] | {'nstarts': len(restarts[ibin])}
+                    if self.fast_likelihood:
+                        polish[ibin] = (best, origin)
+                    else:
+                        self.checkpoint('fit_result', ibin, out[ibin])
+                        self.checkpoint('fit_origin', ibin, origin)
+                if progress is not None:
+                    progress(ibin, istart, status)  # type: ignore
+            polish_tasks = [
+                (ibin, best, out[ibin].x) for ibin, (best, _) in polish.items()
+            ]
+            for ibin, _, status in pool.map(fit_restart, polish_tasks):
+                out[ibin] = status
+                self.checkpoint('fit_result', ibin, status)
+                self.checkpoint('fit_origin', ibin, polish[ibin][1])
+        self.sync_store()
+        self.record_history(out)
+        return dict(sorted(out.items()))
+
+    def run_scan(self, progress: ScanProgress | None = None) -> ScanResult:
+        """
+        Fits every set of `wave_sets` in each selected bin from `niters` starting
+        points, returning the best fit of each set. The Zlm values of the union of all
+        sets are computed once per bin, and every set is fit with a `FastNLL` built
+        from their columns.
+        """
+        assert self.wave_sets is not None
+        assert self.niters is not None
+        union = WaveSet.union(self.wave_sets)
+        union_waves = union.waves()
+        out: ScanResult = self.completed('scan_result')
+        bins = [ibin for ibin in self.selected_bins() if ibin not in out]
+        restarts: dict[int, dict[int, dict[int, MinimizeStatus]]] = {
+            ibin: {iset: {} for iset in range(len(self.wave_sets))} for ibin in bins
+        }
+        tasks = [
+            (ibin, iset, istart, x0, union_waves, wave_set.waves(), wave_set.parameters())
+            for ibin in bins
+            for iset, wave_set in enumerate(self.wave_sets)
+            for istart, x0 in enumerate(self.start_points(ibin, self.niters, wave_set))
+        ]
+        pool = TaskPool(
+            union.model(),
+            {'data': self.binned_data, 'accmc': self.binned_accmc},
+            self.workers,
+            values=lambda name, ibin: self.zlm_values(name, ibin, union_waves),
+            bins=self.selected_bins(),
+        )
+        with pool:
+            for ibin, iset, istart, status in pool.map(fit_wave_set, tasks):
+                restarts[ibin][iset][istart] = status
+                if len(restarts[ibin][iset]) == self.niters and progress is not None:
+                    progress(ibin, iset, best_status(restarts[ibin][iset]))
+                if all(len(r) == self.niters for r in restarts[ibin].values()):
+                    out[ibin] = {
+                        iset: best_status(statuses)
+                        for iset, statuses in restarts[ibin].items()
+                    }
+                    self.checkpoint('scan_result', ibin, out[ibin])
+        self.sync_store()
+        return dict(sorted(out.items()))
+
+    def run_bootstrap(
+        self, fit_results: FitResult, progress: FitProgress | None = None
+    ) -> BootstrapResult:
+        """
+        Refits `nboot` bootstrap replicas of every bin from its best fit. The
+        'resample' mode minimizes the NLL of laddu's resampled datasets, while the
+        'poisson' and 'multinomial' modes reweight the events of the bin by
+        `bootstrap_counts` in a `FastNLL` and minimize with `lbfgs`, so no dataset is
+        copied (but no uncertainties are estimated for each replica).
+        """
         assert self.nboot is not None
-        for ibin, fit_result in fit_results.items():
-            for iboot in range(self.nboot):
-                nll = self.get_nll(ibin, bootstrap=iboot)
-                bootstrap_result = nll.minimize(fit_result.x)
-                out[ibin].append(bootstrap_result)
-        return out
+        out: BootstrapResult = self.completed('bootstrap_result')
+        bootstraps: dict[int, dict[int, ld.Status]] = {
+            ibin: {} for ibin in fit_results if ibin not in out
+        }
+        extra_args = (
+            (self.waves(), self.bootstrap_mode, self.seed)
+            if self.bootstrap_mode != 'resample'
+            else ()
+        )
+        tasks = [
+            (ibin, iboot, fit_results[ibin].x, *extra_args)
+            for ibin in bootstraps
+            for iboot in range(self.nboot)
+        ]
+        task = (
+            fit_bootstrap if self.bootstrap_mode == 'resample' else fit_bootstrap_weighted
+        )
+        with self.task_pool() as pool:
+            for ibin, iboot, status in pool.map(task, tasks):
+                bootstraps[ibin][iboot] = status
+                if len(bootstraps[ibin]) == self.nboot:
+                    out[ibin] = [
+                        bootstraps[ibin][iboot] for iboot in sorted(bootstraps[ibin])
+                    ]
+                    self.checkpoint('bootstrap_result', ibin, out[ibin])
+                if progress is not None:
+                    progress(ibin, iboot, status)
+        self.sync_store()
+        return dict(sorted(out.items()))
+
+    def chain_directory(self, ibin: int) -> Path:
+        # absolute, since the stored chain must not depend on the working directory
+        return self.output_path.resolve().with_suffix('.chains') / f'bin_{ibin:05d}'
+
+    def sampler_settings(self) -> SamplerSettings:
+        assert self.ntau is not None
+        assert self.dtau is not None
+        return SamplerSettings(
+            self.max_steps,
+            self.segment_steps,
+            self.thin,
+            self.burn,
+            np.dtype(self.chain_dtype).str,
+            self.ntau,
+            self.dtau,
+            self.streaming_tau,
+            self.seed,
+            # worker processes cannot print to the terminal
+            self.workers <= 1,
+        )
 
-    def run_mcmc(self, fit_results: FitResult) -> MCMCResult:
-        out = {}
+    def walker_starts(
+        self,
+        ibin: int,
+        fit_result: ld.Status,
+        bootstraps: list[ld.Status] | None = None,
+    ) -> tuple[np.ndarray, str]:
+        """
+        Starting positions of the walkers of a bin and the strategy that produced them.
+        With `walker_init` = 'covariance', walkers are drawn from a normal distribution
+        around the fit with the empirical covariance of the bootstrap fits (if there
+        are more of them than parameters) or else the covariance of the fit, which
+        approximates the posterior so the walkers start out already adapted to its
+        correlations. Otherwise, or if neither covariance is usable, every parameter
+        is drawn independently with a standard deviation of `sigma`.
+        """
         assert self.sigma is not None
         assert self.nwalkers is not None
-        rng = np.random.default_rng(0)
+        rng = np.random.default_rng((self.seed, ibin))
+        x = np.asarray(fit_result.x)
+        if self.walker_init == 'covariance':
+            candidates = []
+            if bootstraps is not None and len(bootstraps) > len(x):
+                xs = np.array([status.x for status in bootstraps])
+                xs = xs[np.all(np.isfinite(xs), axis=1)]
+                candidates.append(('bootstrap', np.cov(xs, rowvar=False)))
+            covariance = getattr(fit_result, 'cov', None)
+            if covariance is not None:
+                # laddu inverts the Hessian of -2 ln L rather than of -ln L
+                candidates.append(('covariance', 2.0 * np.asarray(covariance)))
+            for strategy, covariance in candidates:
+                factor = covariance_factor(covariance)
+                if factor is not None:
+                    steps = rng.standard_normal((self.nwalkers, len(x))) @ factor.T
+                    return x + steps, strategy
+        return rng.normal(x, scale=self.sigma, size=(self.nwalkers, len(x))), 'ball'
+
+    def run_mcmc(
+        self,
+        fit_results: FitResult,
+        progress: MCMCProgress | None = None,
+        *,
+        bootstrap_results: BootstrapResult | None = None,
+    ) -> MCMCResult:
+        """
+        Samples every bin for at most `max_steps` steps, running bins concurrently on
+        the task pool. Chains are streamed to `chain_directory` in segments (keeping
+        every `thin`-th step after `burn` steps, as `chain_dtype`), so only the
+        `StoredChain` describing each bin is kept in memory and in the store. Walkers
+        start from `walker_starts`, using `bootstrap_results` if given.
+        """
+        out: MCMCResult = {
+            ibin: chain
+            for ibin, chain in self.completed('mcmc_result').items()
+            if chain.available()
+        }
+        settings = self.sampler_settings()
+        bootstrap_results = bootstrap_results or {}
+        strategies = {}
+        tasks = []
         for ibin, fit_result in fit_results.items():
-            nll = self.get_nll(ibin)
-            p0 = rng.normal(
-                fit_result.x,
-                scale=self.sigma,
-                size=(self.nwalkers, len(fit_result.x)),
+            if ibin in out:
+                continue
+            p0, strategies[ibin] = self.walker_starts(
+                ibin, fit_result, bootstrap_results.get(ibin)
             )
-            obs = self.get_mcmc_observer(ibin)
-            ensemble = nll.mcmc(p0, 3000, observers=[obs])
-            out[ibin] = (ensemble, obs.latest_tau)
-        return out
+            tasks.append(
+                (
+                    ibin,
+                    p0,
+                    self.waves(),
+                    self.parameters(),
+                    settings,
+                    self.chain_directory(ibin),
+                )
+            )
+        with self.task_pool() as pool:
+            for ibin, chain in pool.map(sample_bin, tasks):
+                chain.init = strategies[ibin]
+                out[ibin] = chain
+                self.checkpoint('mcmc_result', ibin, chain)
+                if progress is not None:
+                    progress(ibin, chain)
+        self.sync_store()
+        return dict(sorted(out.items()))
@@ -1,14 +1,17 @@
+import numpy as np
 from pathlib import Path
 from textual import on
 from textual.containers import Container, Horizontal
 from textual.css.query import NoMatches
 from textual.reactive import reactive
 from textual.screen import Screen
-from textual.validation import Number
-from textual.widgets import Button, Checkbox, Footer, Header, Input, Label
+from textual.validation import Function, Number
+from textual.widgets import Button, Checkbox, Footer, Header, Input, Label, Select
 
-from zlmfit.fit_data import FitData
+from zlmfit.cache import ResultCache, default_directory
+from zlmfit.fit_data import BOOTSTRAP_MODES, FitData
 from zlmfit.fitting_screen import FittingScreen
+from zlmfit.starts import START_METHODS, sobol_available
 
 INVALID_NITERS = 0b00000001
 INVALID_PATH = 0b00000010
@@ -18,17 +21,47 @@ INVALID_SIGMA = 0b00010000
 INVALID_NTAU = 0b00100000
 INVALID_DTAU = 0b01000000
 INVALID_EXTN = 0b10000000
+INVALID_NWORKERS = 0b100000000
+INVALID_ANCHOR_BIN = 0b1000000000
+INVALID_WARM_NITERS = 0b10000000000
+INVALID_NREPRODUCE = 0b100000000000
+INVALID_REPRODUCE_TOL = 0b1000000000000
+INVALID_PRESCREEN = 0b10000000000000
+INVALID_REFINE_NITERS = 0b100000000000000
+INVALID_COARSE_BINS = 0b1000000000000000
+INVALID_MAX_STEPS = 0b10000000000000000
+INVALID_THIN = 0b100000000000000000
+INVALID_BURN = 0b1000000000000000000
+
+
+def parse_coarse_bins(value: str) -> list[int] | None:
+    try:
+        bins = [int(part) for part in value.replace(',', ' ').split()]
+    except ValueError:
+        return None
+    return bins if all(b > 0 for b in bins) else None
 
 
 class FitMenu(Screen):
     CSS_PATH = 'fit_menu.tcss'
 
     niters = reactive(20)
+    nworkers = reactive(1)
+    anchor_bin = reactive(0)
+    warm_niters = reactive(2)
+    refine_niters = reactive(2)
+    coarse_bins = reactive('')
+    nreproduce = reactive(3)
+    prescreen = reactive(0)
+    reproduce_tol = reactive(1e-3)
     nboot = reactive(20)
     nwalkers = reactive(20)
     sigma = reactive(0.1)
     ntau = reactive(20)
     dtau = reactive(0.05)
+    max_steps = reactive(3000)
+    thin = reactive(1)
+    burn = reactive(0)
     output_name = reactive('fit.zlmfit')
     invalid = reactive(0)
 
@@ -50,7 +83,91 @@ class FitMenu(Screen):
                 id='niters',
                 type='integer',
             )
-            yield Label('randomly initialized fits per bin')
+            yield Label('randomly initialized fits per bin on')
+            yield Input(
+                str(self.nworkers),
+                validators=[Number(minimum=1)],
+                id='nworkers',
+                type='integer',
+            )
+            yield Label('worker processes')
+            yield Checkbox('fast likelihood', id='fast_likelihood')
+        with Container(id='start_info'):
+            yield Label('Start points:')
+            yield Select(
+                [
+                    (method, method)
+                    for method in START_METHODS
+                    if method != 'sobol' or sobol_available()
+                ],
+                value='uniform',
+                allow_blank=False,
+                id='start_method',
+            )
+            yield Checkbox('scaled to events in bin', id='scale_starts')
+            yield Label('picking the best of')
+            yield Input(
+                str(self.prescreen),
+                validators=[Number(minimum=0)],
+                id='prescreen',
+                type='integer',
+            )
+            yield Label('candidates (0 = off)')
+        with Container(id='adaptive_info'):
+            yield Checkbox('Adaptive', id='adaptive')
+            with Container(id='adaptive_settings', classes='hidden'):
+                yield Label('stop once the best fit is found')
+                yield Input(
+                    str(self.nreproduce),
+                    validators=[Number(minimum=1)],
+                    id='nreproduce',
+                    type='integer',
+                )
+                yield Label('times within ΔNLL <')
+                yield Input(
+                    str(self.reproduce_tol),
+                    validators=[Number(minimum=0.0)],
+                    id='reproduce_tol',
+                    type='number',
+                )
+        with Container(id='warm_start_info'):
+            yield Checkbox('Warm start', id='warm_start')
+            with Container(id='warm_start_settings', classes='hidden'):
+                yield Label('sweeping out from bin')
+                yield Input(
+                    str(self.anchor_bin),
+                    validators=[Number(minimum=0, maximum=self.fit_data.bins - 1)],
+                    id='anchor_bin',
+                    type='integer',
+                )
+                yield Label('with')
+                yield Input(
+                    str(self.warm_niters),
+                    validators=[Number(minimum=0)],
+                    id='warm_niters',
+                    type='integer',
+                )
+                yield Label('random fits per continued bin')
+        with Container(id='refine_info'):
+            yield Checkbox('Refine', id='refine')
+            with Container(id='refine_settings', classes='hidden'):
+                yield Label('from earlier binnings with')
+                yield Input(
+                    str(self.refine_niters),
+                    validators=[Number(minimum=0)],
+                    id='refine_niters',
+                    type='integer',
+                )
+                yield Label('random fits per bin, after fitting')
+                yield Input(
+                    self.coarse_bins,
+                    placeholder='e.g. 5 10',
+                    validators=[
+                        Function(lambda value: parse_coarse_bins(value) is not None)
+                    ],
+                    id='coarse_bins',
+                )
+                yield Label('bins')
         with Container(id='bootstrap_info'):
             yield Checkbox('Bootstrap', id='bootstrap')
             with Container(id='bootstrap_settings', classes='hidden'):
@@ -61,6 +178,12 @@ class FitMenu(Screen):
                     type='integer',
                 )
                 yield Label('bootstrapped fits', id='bootstrap_label')
+                yield Select(
+                    [(mode, mode) for mode in BOOTSTRAP_MODES],
+                    value='resample',
+                    allow_blank=False,
+                    id='bootstrap_mode',
+                )
         with Container(id='mcmc_info'):
             yield Checkbox('Run MCMC', id='mcmc')
             with Container(id='mcmc_settings', classes='hidden'):
@@ -78,6 +201,13 @@ class FitMenu(Screen):
                         id='sigma',
                         type='number',
                     )
+                    yield Label('around the fit. Walker spread from: ')
+                    yield Select(
+                        [('σ only', 'ball'), ('covariance', 'covariance')],
+                        value='ball',
+                        allow_blank=False,
+                        id='walker_init',
+                    )
                 with Container(id='converge_settings'):
                     yield Label('Converge with steps > ', id='converge_label')
                     yield Input(
@@ -93,9 +223,35 @@ class FitMenu(Screen):
                         id='dtau',
                         type='number',
                     )
+                    yield Checkbox('streaming τ (batch means)', id='streaming_tau')
+                with Container(id='chain_settings'):
+                    yield Label('Stop after ')
+                    yield Input(
+                        str(self.max_steps),
+                        validators=[Number(minimum=1)],
+                        id='max_steps',
+                        type='integer',
+                    )
+                    yield Label('steps, keep every ')
+                    yield Input(
+                        str(self.thin),
+                        validators=[Number(minimum=1)],
+                        id='thin',
+                        type='integer',
+                    )
+                    yield Label('after ')
+                    yield Input(
+                        str(self.burn),
+                        validators=[Number(minimum=0)],
+                        id='burn',
+                        type='integer',
+                    )
+                    yield Checkbox('float32', id='float32_chains')
         with Container(id='output_info'):
             yield Label('Output Name:')
             yield Input('fit.zlmfit', id='fit_path')
+            yield Checkbox('Resume', id='resume')
+            yield Checkbox('Reuse cached results', value=True, id='use_cache')
             with Container(id='pathcheck'):
                 yield Label(
                     '(file already exists)', id='file_exists', classes='hidden error'
@@ -127,10 +283,31 @@ class FitMenu(Screen):
         invalid = 0
         if not self.output_name.endswith('.zlmfit'):
             invalid |= INVALID_EXTN
-        if (Path.cwd() / self.output_name).exists():
+        if (Path.cwd() / self.output_name).exists() and not self.query_one(
+            '#resume', Checkbox
+        ).value:
             invalid |= INVALID_PATH
         if self.niters <= 0:
             invalid |= INVALID_NITERS
+        if self.nworkers <= 0:
+            invalid |= INVALID_NWORKERS
+        if self.prescreen < 0:
+            invalid |= INVALID_PRESCREEN
+        if self.query_one('#adaptive', Checkbox).value:
+            if self.nreproduce <= 0:
+                invalid |= INVALID_NREPRODUCE
+            if self.reproduce_tol < 0.0:
+                invalid |= INVALID_REPRODUCE_TOL
+        if self.query_one('#warm_start', Checkbox).value:
+            if not 0 <= self.anchor_bin < self.fit_data.bins:
+                invalid |= INVALID_ANCHOR_BIN
+            if self.warm_niters < 0:
+                invalid |= INVALID_WARM_NITERS
+        if self.query_one('#refine', Checkbox).value:
+            if self.refine_niters < 0:
+                invalid |= INVALID_REFINE_NITERS
+            if parse_coarse_bins(self.coarse_bins) is None:
+                invalid |= INVALID_COARSE_BINS
         if self.query_one('#bootstrap', Checkbox).value:
             if self.nboot <= 0:
                 invalid |= INVALID_NBOOT
@@ -143,8 +320,32 @@ class FitMenu(Screen):
                 invalid |= INVALID_NTAU
             if self.dtau <= 0.0:
                 invalid |= INVALID_DTAU
+            if self.max_steps <= 0:
+                invalid |= INVALID_MAX_STEPS
+            if self.thin <= 0:
+                invalid |= INVALID_THIN
+            if self.burn < 0 or self.burn >= self.max_steps:
+                invalid |= INVALID_BURN
         return invalid
 
+    @on(Checkbox.Changed, '#adaptive')
+    def change_adaptive(self, event: Checkbox.Changed):
+        self.query_one('#adaptive_info').set_class(event.value, 'active')
+        self.query_one('#adaptive_settings').set_class(not event.value, 'hidden')
+        self.invalid
+
+    @on(Checkbox.Changed, '#refine')
+    def change_refine(self, event: Checkbox.Changed):
+        self.query_one('#refine_info').set_class(event.value, 'active')
+        self.query_one('#refine_settings').set_class(not event.value, 'hidden')
+        self.invalid
+
+    @on(Checkbox.Changed, '#warm_start')
+    def change_warm_start(self, event: Checkbox.Changed):
+        self.query_one('#warm_start_info').set_class(event.value, 'active')
+        self.query_one('#warm_start_settings').set_class(not event.value, 'hidden')
+        self.invalid
+
     @on(Checkbox.Changed, '#bootstrap')
     def change_bootstrap(self, event: Checkbox.Changed):
         self.query_one('#bootstrap_info').set_class(event.value, 'active')
@@ -157,10 +358,46 @@ class FitMenu(Screen):
         self.query_one('#mcmc_settings').set_class(not event.value, 'hidden')
         self.invalid
 
+    @on(Checkbox.Changed, '#resume')
+    def change_resume(self, event: Checkbox.Changed):
+        self.invalid
+
     @on(Input.Changed, '#niters')
     def change_niters(self, event: Input.Changed):
         self.niters = int(event.value) if event.value != '' else 0
 
+    @on(Input.Changed, '#nworkers')
+    def change_nworkers(self, event: Input.Changed):
+        self.nworkers = int(event.value) if event.value != '' else 0
+
+    @on(Input.Changed, '#prescreen')
+    def change_prescreen(self, event: Input.Changed):
+        self.prescreen = int(event.value) if event.value != '' else 0
+
+    @on(Input.Changed, '#nreproduce')
+    def change_nreproduce(self, event: Input.Changed):
+        self.nreproduce = int(event.value) if event.value != '' else 0
+
+    @on(Input.Changed, '#reproduce_tol')
+    def change_reproduce_tol(self, event: Input.Changed):
+        self.reproduce_tol = float(event.value) if event.value != '' else -1.0
+
+    @on(Input.Changed, '#anchor_bin')
+    def change_anchor_bin(self, event: Input.Changed):
+        self.anchor_bin = int(event.value) if event.value != '' else -1
+
+    @on(Input.Changed, '#refine_niters')
+    def change_refine_niters(self, event: Input.Changed):
+        self.refine_niters = int(event.value) if event.value != '' else -1
+
+    @on(Input.Changed, '#coarse_bins')
+    def change_coarse_bins(self, event: Input.Changed):
+        self.coarse_bins = event.value
+
+    @on(Input.Changed, '#warm_niters')
+    def change_warm_niters(self, event: Input.Changed):
+        self.warm_niters = int(event.value) if event.value != '' else -1
+
     @on(Input.Changed, '#nboot')
     def change_nboot(self, event: Input.Changed):
         self.nboot = int(event.value) if event.value != '' else 0
@@ -181,6 +418,18 @@ class FitMenu(Screen):
     def change_dtau(self, event: Input.Changed):
         self.dtau = float(event.value) if event.value != '' else 0.0
 
+    @on(Input.Changed, '#max_steps')
+    def change_max_steps(self, event: Input.Changed):
+        self.max_steps = int(event.value) if event.value != '' else 0
+
+    @on(Input.Changed, '#thin')
+    def change_thin(self, event: Input.Changed):
+        self.thin = int(event.value) if event.value != '' else 0
+
+    @on(Input.Changed, '#burn')
+    def change_burn(self, event: Input.Changed):
+        self.burn = int(event.value) if event.value != '' else -1
+
     @on(Input.Changed, '#fit_path')
     def change_fit_path(self, event: Input.Changed):
         self.output_name = event.value
@@ -194,14 +443,45 @@ class FitMenu(Screen):
     def fit(self):
         output_file_name = self.query_one('#fit_path', Input).value
         self.fit_data.output_path = Path.cwd() / output_file_name
+        if self.query_one('#use_cache', Checkbox).value:
+            self.fit_data.result_cache = ResultCache(default_directory())
+        else:
+            self.fit_data.result_cache = None
         self.fit_data.niters = self.niters
+        self.fit_data.workers = self.nworkers
+        self.fit_data.start_method = str(self.query_one('#start_method', Select).value)
+        self.fit_data.scale_starts = self.query_one('#scale_starts', Checkbox).value
+        self.fit_data.prescreen = self.prescreen
+        self.fit_data.fast_likelihood = self.query_one('#fast_likelihood', Checkbox).value
+        self.fit_data.adaptive = self.query_one('#adaptive', Checkbox).value
+        if self.fit_data.adaptive:
+            self.fit_data.nreproduce = self.nreproduce
+            self.fit_data.reproduce_tol = self.reproduce_tol
+        self.fit_data.warm_start = self.query_one('#warm_start', Checkbox).value
+        if self.fit_data.warm_start:
+            self.fit_data.anchor_bin = self.anchor_bin
+            self.fit_data.warm_niters = self.warm_niters
+        self.fit_data.refine = self.query_one('#refine', Checkbox).value
+        if self.fit_data.refine:
+            self.fit_data.refine_niters = self.refine_niters
+            self.fit_data.coarse_bins = sorted(parse_coarse_bins(self.coarse_bins) or [])
         if self.query_one('#bootstrap', Checkbox).value:
             self.fit_data.bootstrap = True
             self.fit_data.nboot = self.nboot
+            self.fit_data.bootstrap_mode = str(
+                self.query_one('#bootstrap_mode', Select).value
+            )
         if self.query_one('#mcmc', Checkbox).value:
             self.fit_data.mcmc = True
             self.fit_data.nwalkers = self.nwalkers
             self.fit_data.sigma = self.sigma
             self.fit_data.ntau = self.ntau
             self.fit_data.dtau = self.dtau
+            self.fit_data.streaming_tau = self.query_one('#streaming_tau', Checkbox).value
+            self.fit_data.walker_init = str(self.query_one('#walker_init', Select).value)
+            self.fit_data.max_steps = self.max_steps
+            self.fit_data.thin = self.thin
+            self.fit_data.burn = self.burn
+            if self.query_one('#float32_chains', Checkbox).value:
+                self.fit_data.chain_dtype = np.float32
         self.app.push_screen(FittingScreen(self.fit_data))
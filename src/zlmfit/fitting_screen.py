@@ -1,14 +1,13 @@
-import pickle
-from typing import Any
+import time
 from textual import on
 from textual.events import Print
 from textual.screen import Screen
-from textual.widgets import Footer, Header, ProgressBar, RichLog
-import numpy as np
-import asyncio
+from textual.widgets import Footer, Header, Label, ProgressBar, RichLog
+import laddu as ld
 
 from textual.worker import Worker, WorkerState
 
+from zlmfit.chains import StoredChain, convergence_summary
 from zlmfit.fit_data import FitData, FitResult, BootstrapResult, MCMCResult
 
 
@@ -28,6 +27,7 @@ class FittingScreen(Screen):
         yield ProgressBar(self.fit_data.niters, id='iters')
         if self.fit_data.bootstrap:
             yield ProgressBar(self.fit_data.nboot * self.fit_data.bins, id='bootstrap')
+            yield Label('', id='bootstrap_rate')
         if self.fit_data.mcmc:
             yield ProgressBar(self.fit_data.bins, id='mcmc')
         yield RichLog(markup=True)
@@ -36,8 +36,18 @@ class FittingScreen(Screen):
     def on_mount(self):
         self.begin_capture_print()
         self.fit_data.bin_datasets()
+        try:
+            self.fit_data.open_store()
+        except ValueError as e:
+            print(f'[red]{e}[/]')
+            return
         self.run_worker(self.run_fit, name='run_fit', thread=True)
 
+    def on_unmount(self):
+        if self.fit_data.store is not None:
+            self.fit_data.store.close()
+            self.fit_data.store = None
+
     @on(Print)
     def log_printed(self, event: Print):
         if not event.text:
@@ -50,81 +60,101 @@ class FittingScreen(Screen):
                 self.run_worker(self.run_bootstrap, name='run_bootstrap', thread=True)
             elif self.fit_data.mcmc:
                 self.run_worker(self.run_mcmc, name='run_mcmc', thread=True)
+            else:
+                self.finish()
         elif event.worker.name == 'run_bootstrap' and event.state == WorkerState.SUCCESS:
             if self.fit_data.mcmc:
                 self.run_worker(self.run_mcmc, name='run_mcmc', thread=True)
-
-    def update_output(self, key: str, data: Any):
-        out_dict = {}
-        if self.fit_data.output_path.exists():
-            with self.fit_data.output_path.open('rb') as f:
-                out_dict = pickle.load(f)
-        out_dict[key] = data
-        with self.fit_data.output_path.open('wb') as f:
-            pickle.dump(out_dict, f)
-
-    async def run_fit(self):
-        rng = np.random.default_rng(0)
-
-        for ibin in range(self.fit_data.bins):
-            print(f'[red]Fitting bin {ibin}[/]')
-            nll = self.fit_data.get_nll(ibin)
-            best_fit = None
-            best_nll = float('inf')
-            self.query_one('#iters', ProgressBar).update(progress=0)
-            await asyncio.sleep(0)
-
-            for iiter in range(self.fit_data.niters):
-                print(f'[blue]    Fitting iteration {iiter}[/]')
-
-                p0 = rng.uniform(-100.0, 100.0, size=len(nll.parameters))
-                fit_result = nll.minimize(p0)
-                if fit_result.fx < best_nll:
-                    best_fit = fit_result
-                    best_nll = fit_result.fx
-                self.query_one('#iters', ProgressBar).advance(1)
-                await asyncio.sleep(0)
-
-            assert best_fit is not None
-            self.fit_result[ibin] = best_fit
+            else:
+                self.finish()
+        elif event.worker.name == 'run_mcmc' and event.state == WorkerState.SUCCESS:
+            self.finish()
+
+    def finish(self):
+        path = self.fit_data.export_columnar()
+        print(f'[green]Results written to {self.fit_data.output_path} and {path}[/]')
+
+    def update_fit_progress(self, done: int, total: int, bin_complete: bool):
+        self.query_one('#iters', ProgressBar).update(total=total, progress=done)
+        if bin_complete:
             self.query_one('#fit', ProgressBar).advance(1)
-            await asyncio.sleep(0)
 
+    def advance(self, bar: str, amount: int):
+        self.query_one(bar, ProgressBar).advance(amount)
+
+    def show_completed(self):
+        # looking up the result cache can read the input files, so this runs in the
+        # fit worker rather than on mount
+        completed_fits = len(self.fit_data.completed('fit_result'))
+        if completed_fits:
+            print(f'[green]Resuming with {completed_fits} bin(s) already fit[/]')
+            self.app.call_from_thread(self.advance, '#fit', completed_fits)
+        if self.fit_data.bootstrap:
+            completed_bootstraps = len(self.fit_data.completed('bootstrap_result'))
+            self.app.call_from_thread(
+                self.advance, '#bootstrap', completed_bootstraps * self.fit_data.nboot
+            )
+        if self.fit_data.mcmc:
+            completed_mcmc = len(self.fit_data.completed('mcmc_result'))
+            self.app.call_from_thread(self.advance, '#mcmc', completed_mcmc)
+
+    def run_fit(self):
+        self.show_completed()
+        done = {ibin: 0 for ibin in range(self.fit_data.bins)}
+
+        def progress(ibin: int, iiter: int, status: ld.Status):
+            print(
+                f'[blue]    Bin {ibin}: fit iteration {iiter} finished (NLL = {status.fx})[/]'
+            )
+            done[ibin] += 1
+            total = self.fit_data.fit_starts[ibin]
+            if done[ibin] == total:
+                print(f'[red]Bin {ibin} complete after {total} fit(s)[/]')
+            self.app.call_from_thread(
+                self.update_fit_progress, done[ibin], total, done[ibin] == total
+            )
+
+        print(
+            f'[red]Fitting {self.fit_data.bins} bins on {self.fit_data.workers} worker(s)[/]'
+        )
+        self.fit_result = self.fit_data.run_fit(progress)
         print('[green]Fitting complete![/]')
-        self.update_output('fit_result', self.fit_result)
-
-    async def run_bootstrap(self):
-        out = {ibin: [] for ibin in self.fit_result.keys()}
-        for ibin, fit_result in self.fit_result.items():
-            print(f'[red]Fitting bin {ibin}[/]')
-            for iboot in range(self.fit_data.nboot):
-                print(f'[blue]    Fitting bootstrap {iboot}[/]')
-                nll = self.fit_data.get_nll(ibin, bootstrap=iboot)
-                bootstrap_result = nll.minimize(fit_result.x)
-                out[ibin].append(bootstrap_result)
-                self.query_one('#bootstrap', ProgressBar).advance(1)
-                await asyncio.sleep(0)
-        self.bootstrap_result = out
-        self.update_output('bootstrap_result', self.bootstrap_result)
-
-    async def run_mcmc(self):
-        out = {}
-        rng = np.random.default_rng(0)
-        for ibin, fit_result in self.fit_result.items():
-            print(f'[yellow]Running MCMC on bin {ibin}[/]')
-            nll = self.fit_data.get_nll(ibin)
-            p0 = rng.normal(
-                fit_result.x,
-                scale=self.fit_data.sigma,
-                size=(self.fit_data.nwalkers, len(fit_result.x)),
+
+    def update_bootstrap_progress(self, rate: float):
+        self.query_one('#bootstrap', ProgressBar).advance(1)
+        self.query_one('#bootstrap_rate', Label).update(f'{rate:.2f} bootstraps/s')
+
+    def run_bootstrap(self):
+        start = time.perf_counter()
+        done = 0
+
+        def progress(ibin: int, iboot: int, status: ld.Status):
+            nonlocal done
+            done += 1
+            rate = done / (time.perf_counter() - start)
+            print(
+                f'[blue]    Bin {ibin}: bootstrap {iboot} finished (NLL = {status.fx}, {rate:.2f} bootstraps/s)[/]'
             )
-            obs = self.fit_data.get_mcmc_observer(ibin)
-            ensemble = nll.mcmc(p0, 3000, observers=[obs])
-            out[ibin] = (ensemble, obs.latest_tau)
+            self.app.call_from_thread(self.update_bootstrap_progress, rate)
+
+        self.bootstrap_result = self.fit_data.run_bootstrap(self.fit_result, progress)
+        elapsed = time.perf_counter() - start
+        print(
+            f'[green]Bootstrapping complete! ({done} bootstraps in {elapsed:.1f}s, {done / elapsed:.2f} bootstraps/s)[/]'
+        )
+
+    def run_mcmc(self):
+        def progress(ibin: int, chain: StoredChain):
+            state = 'converged' if chain.converged else 'stopped'
             print(
-                f'[yellow]Converged after {ensemble.dimension[1]} steps with tau = {obs.latest_tau}[/]'
+                f'[yellow]Bin {ibin}: {state} after {chain.steps} steps with tau = {chain.tau} ({chain.kept} steps kept, {chain.init} start)[/]'
             )
-            self.query_one('#mcmc', ProgressBar).advance(1)
-            await asyncio.sleep(0)
-        self.mcmc_result = out
-        self.update_output('mcmc_result', self.mcmc_result)
+            self.app.call_from_thread(self.query_one('#mcmc', ProgressBar).advance, 1)
+
+        print('[yellow]Running MCMC[/]')
+        self.mcmc_result = self.fit_data.run_mcmc(
+            self.fit_result, progress, bootstrap_results=self.bootstrap_result
+        )
+        for line in convergence_summary(list(self.mcmc_result.values())).values():
+            print(f'[yellow]Walker starts from {line}[/]')
+        print('[green]MCMC complete![/]')
@@ -1,3 +1,7 @@
+import argparse
+import sys
+from pathlib import Path
+
 from textual.app import App
 
 
@@ -15,6 +19,57 @@ class ZlmFitApp(App):
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        prog='zlmfit',
+        description='Zlm partial-wave fits (run without arguments for the UI)',
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser(
+        'run', help='run a fit headless from a TOML config'
+    )
+    run_parser.add_argument('config', type=Path)
+    run_parser.add_argument(
+        '--jsonl', action='store_true', help='report progress as JSON lines'
+    )
+    shard_parser = subparsers.add_parser(
+        'shard', help='run a fit as a queue of bins shared by many workers'
+    )
+    shard_parser.add_argument(
+        '--jsonl', action='store_true', help='report progress as JSON lines'
+    )
+    shard_commands = shard_parser.add_subparsers(dest='shard_command', required=True)
+    init_parser = shard_commands.add_parser('init', help='queue every bin of a config')
+    init_parser.add_argument('config', type=Path)
+    init_parser.add_argument('queue', type=Path)
+    work_parser = shard_commands.add_parser('work', help='claim and fit queued bins')
+    work_parser.add_argument('queue', type=Path)
+    work_parser.add_argument(
+        '--stale',
+        type=float,
+        help='take over bins whose worker has been silent for this many seconds',
+    )
+    merge_parser = shard_commands.add_parser('merge', help='merge the fitted bins')
+    merge_parser.add_argument('queue', type=Path)
+    merge_parser.add_argument('output', type=Path, nargs='?')
+    status_parser = shard_commands.add_parser('status', help='show queue progress')
+    status_parser.add_argument('queue', type=Path)
+    args = parser.parse_args()
+    if args.command == 'run':
+        from zlmfit.batch import run
+
+        sys.exit(run(args.config, jsonl=args.jsonl))
+    if args.command == 'shard':
+        from zlmfit import shard
+        from zlmfit.batch import Reporter
+
+        report = Reporter(jsonl=args.jsonl)
+        if args.shard_command == 'init':
+            sys.exit(shard.init(args.config, args.queue, report))
+        if args.shard_command == 'work':
+            sys.exit(shard.work(args.queue, report, stale=args.stale))
+        if args.shard_command == 'merge':
+            sys.exit(shard.merge(args.queue, report, args.output))
+        sys.exit(shard.status(args.queue, report))
     ZlmFitApp().run()
 
 
@@ -0,0 +1,86 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class MinimizeStatus:
+    """
+    The fields of ``laddu.Status`` that the fitting code reads.
+    """
+
+    x: np.ndarray
+    fx: float
+    converged: bool
+    n_f_evals: int
+    n_g_evals: int
+    message: str
+    err: np.ndarray | None = None
+
+
+def lbfgs(
+    value_and_gradient: Callable[[np.ndarray], tuple[float, np.ndarray]],
+    x0: np.ndarray,
+    *,
+    memory: int = 10,
+    max_steps: int = 4000,
+    tol_g_abs: float = 1e-5,
+    tol_f_rel: float = 1e-12,
+) -> MinimizeStatus:
+    """
+    Unbounded L-BFGS with a backtracking (Armijo) line search.
+    """
+    x = np.array(x0, dtype=np.float64)
+    fx, gx = value_and_gradient(x)
+    n_evals = 1
+    steps: list[np.ndarray] = []
+    gradient_steps: list[np.ndarray] = []
+    for _ in range(max_steps):
+        if not np.isfinite(fx):
+            return MinimizeStatus(x, fx, False, n_evals, n_evals, 'non-finite value')
+        if np.max(np.abs(gx)) < tol_g_abs:
+            return MinimizeStatus(x, fx, True, n_evals, n_evals, 'gradient converged')
+        # two-loop recursion for the quasi-Newton direction
+        direction = -gx
+        alphas = []
+        for s, y in zip(reversed(steps), reversed(gradient_steps)):
+            alpha = (s @ direction) / (y @ s)
+            direction = direction - alpha * y
+            alphas.append(alpha)
+        if steps:
+            direction *= (steps[-1] @ gradient_steps[-1]) / (
+                gradient_steps[-1] @ gradient_steps[-1]
+            )
+        for s, y, alpha in zip(steps, gradient_steps, reversed(alphas)):
+            beta = (y @ direction) / (y @ s)
+            direction = direction + (alpha - beta) * s
+        slope = gx @ direction
+        if slope >= 0.0:
+            direction, slope = -gx, -(gx @ gx)
+            steps.clear()
+            gradient_steps.clear()
+        step = 1.0 if steps else min(1.0, 1.0 / max(np.max(np.abs(gx)), 1e-12))
+        while True:
+            x_new = x + step * direction
+            fx_new, gx_new = value_and_gradient(x_new)
+            n_evals += 1
+            if np.isfinite(fx_new) and fx_new <= fx + 1e-4 * step * slope:
+                break
+            step *= 0.5
+            if step < 1e-20:
+                return MinimizeStatus(
+                    x, fx, False, n_evals, n_evals, 'line search failed'
+                )
+        s, y = x_new - x, gx_new - gx
+        if s @ y > 1e-12 * (y @ y):
+            steps.append(s)
+            gradient_steps.append(y)
+            if len(steps) > memory:
+                steps.pop(0)
+                gradient_steps.pop(0)
+        converged_f = abs(fx - fx_new) <= tol_f_rel * max(abs(fx), abs(fx_new), 1.0)
+        x, fx, gx = x_new, fx_new, gx_new
+        if converged_f:
+            return MinimizeStatus(x, fx, True, n_evals, n_evals, 'function converged')
+    return MinimizeStatus(x, fx, False, n_evals, n_evals, 'maximum steps reached')
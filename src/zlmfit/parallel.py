@@ -0,0 +1,324 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from multiprocessing import resource_tracker
+from collections.abc import Callable, Iterable, Iterator
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from pathlib import Path
+from typing import Any, Protocol
+
+import laddu as ld
+import numpy as np
+
+from zlmfit.amplitudes import FastNLL, WaveProjector, zlm_values
+
+
+type ValueSource = Callable[[str, int], np.ndarray]
+
+
+class NLLSource(Protocol):
+    def get_nll(self, ibin: int, *, bootstrap: int | None = None) -> ld.NLL: ...
+
+    def get_fast_nll(self, ibin: int, waves: list) -> FastNLL: ...
+
+    def get_projector(
+        self, ibin: int, waves: list, parameters: list[str]
+    ) -> WaveProjector: ...
+
+    def get_wave_set_nll(
+        self, ibin: int, union: list, waves: list, parameters: list[str]
+    ) -> FastNLL: ...
+
+
+def dataset_to_arrays(dataset: ld.Dataset) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    events = dataset.events
+    if not events:
+        return np.empty((0, 0, 4)), np.empty((0, 0, 3)), np.empty(0)
+    p4s = np.array([[p4.to_numpy() for p4 in event.p4s] for event in events])
+    eps = np.array([[e.to_numpy() for e in event.eps] for event in events])
+    return p4s, eps, np.asarray(dataset.weights, dtype=np.float64)
+
+
+def arrays_to_dataset(
+    p4s: np.ndarray, eps: np.ndarray, weights: np.ndarray
+) -> ld.Dataset:
+    return ld.Dataset(
+        [
+            ld.Event(
+                [ld.Vector4.from_array(p4) for p4 in event_p4s],
+                [ld.Vector3.from_array(e) for e in event_eps],
+                float(weight),
+            )
+            for event_p4s, event_eps, weight in zip(p4s, eps, weights)
+        ]
+    )
+
+
+def spool_bins(directory: Path, name: str, binned: ld.BinnedDataset, bins: Iterable[int]):
+    for ibin in bins:
+        p4s, eps, weights = dataset_to_arrays(binned[ibin])
+        np.save(directory / f'{name}_{ibin}_p4s.npy', p4s)
+        np.save(directory / f'{name}_{ibin}_eps.npy', eps)
+        np.save(directory / f'{name}_{ibin}_weights.npy', weights)
+
+
+class BinCache:
+    """
+    Builds the NLL for a bin from a shared model, keeping the datasets of the most
+    recently used bin (and its unresampled NLL) in memory. Tasks are submitted in
+    bin-major order, so every bin is loaded once per process.
+    """
+
+    def __init__(self, model: ld.Model):
+        self.model = model
+        self._ibin: int | None = None
+        self._datasets: dict[str, ld.Dataset] = {}
+        self._nll: ld.NLL | None = None
+        self._fast_nll: FastNLL | None = None
+        self._projector: WaveProjector | None = None
+        self._union_values: dict[str, np.ndarray] = {}
+        self._wave_set_nlls: dict[tuple, FastNLL] = {}
+
+    def load(self, name: str, ibin: int) -> ld.Dataset:
+        raise NotImplementedError
+
+    def dataset(self, name: str, ibin: int) -> ld.Dataset:
+        if self._ibin != ibin:
+            self._ibin = ibin
+            self._datasets = {}
+            self._nll = None
+            self._fast_nll = None
+            self._projector = None
+            self._union_values = {}
+            self._wave_set_nlls = {}
+        if name not in self._datasets:
+            self._datasets[name] = self.load(name, ibin)
+        return self._datasets[name]
+
+    def get_nll(self, ibin: int, *, bootstrap: int | None = None) -> ld.NLL:
+        data = self.dataset('data', ibin)
+        accmc = self.dataset('accmc', ibin)
+        if bootstrap is not None:
+            return ld.NLL(self.model, data.bootstrap(bootstrap), accmc)
+        if self._nll is None:
+            self._nll = ld.NLL(self.model, data, accmc)
+        return self._nll
+
+    def values(self, name: str, ibin: int) -> np.ndarray | None:
+        return None
+
+    def get_fast_nll(self, ibin: int, waves: list) -> FastNLL:
+        data = self.dataset('data', ibin)
+        accmc = self.dataset('accmc', ibin)
+        if self._fast_nll is None:
+            self._fast_nll = FastNLL(
+                waves,
+                self.model.parameters,
+                data,
+                accmc,
+                data_values=self.values('data', ibin),
+                accmc_values=self.values('accmc', ibin),
+            )
+        return self._fast_nll
+
+    def get_projector(
+        self, ibin: int, waves: list, parameters: list[str]
+    ) -> WaveProjector:
+        accmc = self.dataset('accmc', ibin)
+        if self._projector is None:
+            self._projector = WaveProjector(
+                waves, parameters, accmc, values=self.values('accmc', ibin)
+            )
+        return self._projector
+
+    def union_values(self, name: str, ibin: int, union: list) -> np.ndarray:
+        """
+        Zlm values of the union of the waves of a scan, where the model of the source
+        is the union model (so precomputed values are those of the union).
+        """
+        dataset = self.dataset(name, ibin)
+        if name not in self._union_values:
+            values = self.values(name, ibin)
+            self._union_values[name] = (
+                values if values is not None else zlm_values(union, dataset)
+            )
+        return self._union_values[name]
+
+    def get_wave_set_nll(
+        self, ibin: int, union: list, waves: list, parameters: list[str]
+    ) -> FastNLL:
+        key = (tuple(waves), tuple(parameters))
+        if self._ibin != ibin or key not in self._wave_set_nlls:
+            columns = [union.index(wave) for wave in waves]
+            data_values = self.union_values('data', ibin, union)[:, columns]
+            accmc_values = self.union_values('accmc', ibin, union)[:, columns]
+            self._wave_set_nlls[key] = FastNLL(
+                waves,
+                parameters,
+                self.dataset('data', ibin),
+                self.dataset('accmc', ibin),
+                data_values=data_values,
+                accmc_values=accmc_values,
+            )
+        return self._wave_set_nlls[key]
+
+
+class InMemoryBins(BinCache):
+    def __init__(
+        self,
+        model: ld.Model,
+        binned: dict[str, ld.BinnedDataset],
+        values: ValueSource | None = None,
+    ):
+        super().__init__(model)
+        self.binned = binned
+        self._values = values
+
+    def load(self, name: str, ibin: int) -> ld.Dataset:
+        return self.binned[name][ibin]
+
+    def values(self, name: str, ibin: int) -> np.ndarray | None:
+        return self._values(name, ibin) if self._values is not None else None
+
+
+class SpooledBins(BinCache):
+    def __init__(self, model: ld.Model, directory: Path):
+        super().__init__(model)
+        self.directory = directory
+
+    def load(self, name: str, ibin: int) -> ld.Dataset:
+        return arrays_to_dataset(
+            *(
+                np.load(self.directory / f'{name}_{ibin}_{array}.npy', mmap_mode='r')
+                for array in ('p4s', 'eps', 'weights')
+            )
+        )
+
+
+_WORKER_SOURCE: SpooledBins | None = None
+
+
+def _init_worker(directory: Path, model: ld.Model, threads: int):
+    global _WORKER_SOURCE
+    # laddu evaluates in parallel over events, so split the cores between processes
+    os.environ.setdefault('RAYON_NUM_THREADS', str(threads))
+    _WORKER_SOURCE = SpooledBins(model, directory)
+
+
+def _run_task(task: Callable[..., Any], args: tuple) -> Any:
+    assert _WORKER_SOURCE is not None
+    return task(_WORKER_SOURCE, *args)
+
+
+class TaskPool:
+    """
+    Runs per-bin tasks either in-process (``workers <= 1``) or on a pool of worker
+    processes. Every task is called as ``task(source, *args)`` where ``source`` provides
+    ``get_nll``, and results are yielded in order of completion. In-process tasks
+    take precomputed Zlm values from ``values(name, ibin)`` if it is given. Only
+    ``bins`` (every bin by default) are spooled for the worker processes.
+    """
+
+    def __init__(
+        self,
+        model: ld.Model,
+        binned: dict[str, ld.BinnedDataset],
+        workers: int = 1,
+        values: ValueSource | None = None,
+        bins: list[int] | None = None,
+    ):
+        self.model = model
+        self.binned = binned
+        self.workers = workers
+        self.values = values
+        self.bins = bins
+        self._directory: Path | None = None
+        self._executor: ProcessPoolExecutor | None = None
+
+    def __enter__(self) -> 'TaskPool':
+        if self.workers > 1:
+            self._directory = Path(tempfile.mkdtemp(prefix='zlmfit-'))
+            for name, binned in self.binned.items():
+                bins = range(len(binned)) if self.bins is None else self.bins
+                spool_bins(self._directory, name, binned, bins)
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # the resource tracker inherits stderr, which textual replaces while running
+            stderr, sys.stderr = sys.stderr, sys.__stderr__
+            try:
+                resource_tracker.ensure_running()
+            finally:
+                sys.stderr = stderr
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self._directory, self.model, threads),
+            )
+        return self
+
+    def __exit__(self, *_):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def map(self, task: Callable[..., Any], tasks: Iterable[tuple]) -> Iterator[Any]:
+        if self._executor is None:
+            source = InMemoryBins(self.model, self.binned, self.values)
+            for args in tasks:
+                yield task(source, *args)
+            return
+        futures: list[Future] = [
+            self._executor.submit(_run_task, task, args) for args in tasks
+        ]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def run(
+        self,
+        task: Callable[..., Any],
+        tasks: Iterable[tuple],
+        then: Callable[[Any], Iterable[tuple]],
+    ) -> Iterator[Any]:
+        """
+        Like `map`, but after each result is consumed, ``then(result)`` may schedule
+        more tasks, so tasks can depend on the results of earlier ones.
+        """
+        if self._executor is None:
+            source = InMemoryBins(self.model, self.binned, self.values)
+            queue = deque(tasks)
+            while queue:
+                result = task(source, *queue.popleft())
+                yield result
+                # depth-first, so the bin cache keeps hitting the same bin
+                queue.extendleft(reversed(list(then(result))))
+            return
+        executor = self._executor
+        pending = {executor.submit(_run_task, task, args) for args in tasks}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    yield result
+                    pending |= {
+                        executor.submit(_run_task, task, args) for args in then(result)
+                    }
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from zlmfit.fit_data import FitData, ScanResult
+
+
+@dataclass
+class ScanRow:
+    """
+    The best fit of one wave set in one bin. ``nll`` is -2 ln L (up to a constant),
+    so the information criteria are AIC = nll + 2k and BIC = nll + k ln n for k
+    parameters and n events.
+    """
+
+    ibin: int
+    wave_set: str
+    nll: float
+    nparams: int
+    nevents: int
+    converged: bool
+
+    @property
+    def aic(self) -> float:
+        return self.nll + 2 * self.nparams
+
+    @property
+    def bic(self) -> float:
+        return self.nll + self.nparams * np.log(self.nevents)
+
+
+def compare(fit_data: FitData, results: ScanResult) -> list[ScanRow]:
+    assert fit_data.wave_sets is not None
+    nevents = fit_data.bin_counts()
+    return [
+        ScanRow(
+            ibin,
+            str(fit_data.wave_sets[iset]),
+            status.fx,
+            len(status.x),
+            int(nevents[ibin]),
+            status.converged,
+        )
+        for ibin, statuses in results.items()
+        for iset, status in sorted(statuses.items())
+    ]
+
+
+def format_table(rows: list[ScanRow]) -> str:
+    """
+    One line per bin and wave set, with AIC and BIC relative to the best set in the bin.
+    """
+    best_aic: dict[int, float] = {}
+    best_bic: dict[int, float] = {}
+    for row in rows:
+        best_aic[row.ibin] = min(best_aic.get(row.ibin, np.inf), row.aic)
+        best_bic[row.ibin] = min(best_bic.get(row.ibin, np.inf), row.bic)
+    width = max([len('wave set'), *(len(row.wave_set) for row in rows)])
+    lines = [
+        f'{"bin":>4}  {"wave set":<{width}}  {"NLL":>14}  {"k":>3}'
+        f'  {"ΔAIC":>10}  {"ΔBIC":>10}  converged'
+    ]
+    for row in rows:
+        lines.append(
+            f'{row.ibin:>4}  {row.wave_set:<{width}}  {row.nll:>14.4f}  {row.nparams:>3}'
+            f'  {row.aic - best_aic[row.ibin]:>10.4f}'
+            f'  {row.bic - best_bic[row.ibin]:>10.4f}  {row.converged}'
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,393 @@
+"""
+Sharded execution over a shared directory, for running one fit on many processes or
+nodes with nothing more than a common filesystem:
+
+- ``zlmfit shard init config.toml QUEUE`` writes one task per bin into ``QUEUE``
+- ``zlmfit shard work QUEUE`` (started any number of times) claims tasks until none
+  are left and writes each bin to its own result file
+- ``zlmfit shard merge QUEUE`` combines the per-bin results into the ``.zlmfit``
+  output named in the config
+
+A task is claimed by exclusively creating its lock file. Workers touch their lock
+from a separate process while a bin runs (a fit holds the GIL for its whole
+duration), so a lock that has not been touched for ``stale`` seconds belongs to a dead
+worker and may be taken over. Each claim checkpoints into its own staging file, which
+the next owner of the bin resumes from, and a bin is only completed (and its staging
+file moved into place) by the worker that still holds its lock.
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from dataclasses import replace
+from typing import Any
+
+from zlmfit.batch import (
+    EXIT_CONFIG,
+    EXIT_FAILURE,
+    EXIT_SUCCESS,
+    ConfigError,
+    Reporter,
+    configure,
+    load_config,
+    run_stages,
+    write_scan,
+)
+from zlmfit.chains import StoredChain
+from zlmfit.columnar import parameter_names, write_columnar
+from zlmfit.store import ResultStore
+
+QUEUE = 'queue.json'
+
+# run by `Heartbeat` in its own interpreter; it stops once its stdin closes (which also
+# happens if the worker dies) or once the lock no longer names its owner
+HEARTBEAT = """
+import os, sys, threading
+path, owner, interval = sys.argv[1], sys.argv[2], float(sys.argv[3])
+stop = threading.Event()
+threading.Thread(target=lambda: (sys.stdin.read(), stop.set()), daemon=True).start()
+while not stop.wait(interval):
+    try:
+        with open(path) as f:
+            if f.read().split()[:1] != [owner]:
+                break
+        os.utime(path)
+    except OSError:
+        break
+"""
+
+
+class WorkQueue:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.tasks = directory / 'tasks'
+        self.locks = directory / 'locks'
+        self.done = directory / 'done'
+        self.results = directory / 'results'
+
+    @staticmethod
+    def create(
+        directory: Path, config: dict[str, Any], base: Path, bins: int
+    ) -> 'WorkQueue':
+        queue = WorkQueue(directory)
+        if (directory / QUEUE).exists():
+            raise ConfigError(f'{directory} already contains a work queue!')
+        for path in (queue.tasks, queue.locks, queue.done, queue.results):
+            path.mkdir(parents=True, exist_ok=True)
+        for ibin in range(bins):
+            queue._write(queue.tasks / f'{ibin:05d}.json', {'bin': ibin})
+        # written last, so workers never see a partially created queue
+        queue._write(
+            directory / QUEUE,
+            {'config': config, 'base': str(base.resolve()), 'bins': bins},
+        )
+        return queue
+
+    @staticmethod
+    def _write(path: Path, data: Any):
+        staging = path.with_name(f'.{path.name}.tmp')
+        staging.write_text(json.dumps(data))
+        staging.replace(path)
+
+    def description(self) -> dict[str, Any]:
+        try:
+            return json.loads((self.directory / QUEUE).read_text())
+        except FileNotFoundError as e:
+            raise ConfigError(f'{self.directory} is not a work queue!') from e
+
+    def bins(self) -> list[int]:
+        return sorted(
+            json.loads(path.read_text())['bin'] for path in self.tasks.glob('*.json')
+        )
+
+    def lock_path(self, ibin: int) -> Path:
+        return self.locks / f'{ibin:05d}.lock'
+
+    def result_path(self, ibin: int) -> Path:
+        return self.results / f'{ibin:05d}.zlmfit'
+
+    def staging_path(self, ibin: int, worker: str) -> Path:
+        return self.results / f'{ibin:05d}.{worker}.zlmfit'
+
+    def resume(self, ibin: int, staging: Path):
+        """
+        Starts a staging file from the most recent checkpoint of the bin left by an
+        earlier owner, if there is one.
+        """
+        if staging.exists():
+            return
+        previous = []
+        for path in self.results.glob(f'{ibin:05d}.*.zlmfit'):
+            try:
+                previous.append((path.stat().st_mtime, path))
+            except FileNotFoundError:  # discarded by a worker that lost the bin
+                continue
+        if previous:
+            path = max(previous)[1]
+            shutil.copyfile(path, staging)
+            if path.with_suffix('.chains').is_dir():
+                shutil.copytree(
+                    path.with_suffix('.chains'),
+                    staging.with_suffix('.chains'),
+                    dirs_exist_ok=True,
+                )
+
+    @staticmethod
+    def discard(staging: Path):
+        staging.unlink(missing_ok=True)
+        shutil.rmtree(staging.with_suffix('.chains'), ignore_errors=True)
+
+    def owns(self, ibin: int, worker: str) -> bool:
+        try:
+            return self.lock_path(ibin).read_text().split()[:1] == [worker]
+        except FileNotFoundError:
+            return False
+
+    def is_done(self, ibin: int) -> bool:
+        return (self.done / f'{ibin:05d}').exists()
+
+    def pending(self) -> list[int]:
+        return [ibin for ibin in self.bins() if not self.is_done(ibin)]
+
+    def claim(self, worker: str, stale: float | None = None) -> int | None:
+        for ibin in self.pending():
+            lock = self.lock_path(ibin)
+            if stale is not None:
+                self._break_stale(lock, stale)
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(f'{worker} {time.time()}\n')
+            if self.is_done(ibin):  # finished between listing and locking
+                lock.unlink(missing_ok=True)
+                continue
+            return ibin
+        return None
+
+    def _break_stale(self, lock: Path, stale: float):
+        try:
+            if time.time() - lock.stat().st_mtime < stale:
+                return
+            # renaming is atomic, so only one worker can break a given lock
+            lock.rename(
+                lock.with_name(f'{lock.name}.stale-{os.getpid()}-{time.time_ns()}')
+            )
+        except FileNotFoundError:
+            return
+
+    def complete(self, ibin: int, worker: str, staging: Path) -> bool:
+        """
+        Moves the staging file of a bin (and its chains) into place and marks the bin
+        done, unless its lock has been taken over by another worker (in which case
+        nothing is changed).
+        """
+        if not self.owns(ibin, worker):
+            return False
+        result = self.result_path(ibin)
+        if staging.with_suffix('.chains').is_dir():
+            shutil.rmtree(result.with_suffix('.chains'), ignore_errors=True)
+            staging.with_suffix('.chains').replace(result.with_suffix('.chains'))
+        staging.replace(result)
+        (self.done / f'{ibin:05d}').touch()
+        self.lock_path(ibin).unlink(missing_ok=True)
+        return True
+
+    def release(self, ibin: int, worker: str):
+        if self.owns(ibin, worker):
+            self.lock_path(ibin).unlink(missing_ok=True)
+
+    def records(self) -> Iterator[tuple[int, ResultStore]]:
+        for ibin in self.bins():
+            path = self.result_path(ibin)
+            if self.is_done(ibin) and path.exists():
+                yield ibin, ResultStore(path)
+
+
+class Heartbeat:
+    """
+    Touches a lock file every ``interval`` seconds while it names ``owner``. This runs
+    in a child interpreter rather than a thread, since a fit holds the GIL throughout.
+    """
+
+    def __init__(self, path: Path, owner: str, interval: float):
+        self.path = path
+        self.owner = owner
+        self.interval = interval
+        self._process: subprocess.Popen | None = None
+
+    def __enter__(self) -> 'Heartbeat':
+        self._process = subprocess.Popen(
+            [
+                sys.executable,
+                '-c',
+                HEARTBEAT,
+                str(self.path),
+                self.owner,
+                str(self.interval),
+            ],
+            stdin=subprocess.PIPE,
+        )
+        return self
+
+    def __exit__(self, *_):
+        assert self._process is not None and self._process.stdin is not None
+        self._process.stdin.close()
+        self._process.wait()
+
+
+def init(config_path: Path, directory: Path, report: Reporter) -> int:
+    try:
+        config = load_config(config_path)
+        bins = config.get('binning', {}).get('bins')
+        if not isinstance(bins, int) or bins <= 0:
+            raise ConfigError("Setting 'bins' must be a positive integer")
+        WorkQueue.create(directory, config, config_path.parent, bins)
+    except ConfigError as e:
+        report('error', f'Configuration error: {e}', error=str(e), kind='config')
+        return EXIT_CONFIG
+    report('init', f'Queued {bins} bins in {directory}', queue=str(directory), bins=bins)
+    return EXIT_SUCCESS
+
+
+def work(directory: Path, report: Reporter, *, stale: float | None = None) -> int:
+    queue = WorkQueue(directory)
+    worker = f'{socket.gethostname()}-{os.getpid()}'
+    try:
+        description = queue.description()
+        fit_data, _ = configure(description['config'], Path(description['base']))
+    except ConfigError as e:
+        report('error', f'Configuration error: {e}', error=str(e), kind='config')
+        return EXIT_CONFIG
+    fit_data.bin_datasets()
+    interval = stale / 4 if stale is not None else 60.0
+    while (ibin := queue.claim(worker, stale)) is not None:
+        report('claim', f'{worker} claimed bin {ibin}', bin=ibin, worker=worker)
+        staging = queue.staging_path(ibin, worker)
+        queue.resume(ibin, staging)
+        fit_data.bin_subset = [ibin]
+        fit_data.output_path = staging
+        try:
+            with Heartbeat(queue.lock_path(ibin), worker, interval):
+                fit_data.open_store()
+                run_stages(fit_data, report)
+        except Exception as e:
+            queue.release(ibin, worker)
+            report('error', f'Bin {ibin} failed: {e!r}', bin=ibin, error=repr(e))
+            return EXIT_FAILURE
+        finally:
+            if fit_data.store is not None:
+                fit_data.store.close()
+                fit_data.store = None
+        if not queue.complete(ibin, worker, staging):
+            queue.discard(staging)
+            report(
+                'lost',
+                f'{worker} lost the lock on bin {ibin} and dropped its result',
+                bin=ibin,
+                worker=worker,
+            )
+            continue
+        report('complete', f'Bin {ibin} complete', bin=ibin)
+    report('done', f'{worker} found no more bins to claim', worker=worker)
+    return EXIT_SUCCESS
+
+
+def merge(directory: Path, report: Reporter, output: Path | None = None) -> int:
+    queue = WorkQueue(directory)
+    try:
+        description = queue.description()
+        if output is None:
+            output = Path(description['base']) / description['config'].get('fit', {}).get(
+                'output', 'fit.zlmfit'
+            )
+        output = output.resolve()
+        if output.exists():
+            raise ConfigError(f'{output} already exists!')
+    except ConfigError as e:
+        report('error', f'Configuration error: {e}', error=str(e), kind='config')
+        return EXIT_CONFIG
+    pending = queue.pending()
+    if pending:
+        report(
+            'error',
+            f'{len(pending)} bin(s) are not complete: {pending}',
+            pending=pending,
+            kind='incomplete',
+        )
+        return EXIT_FAILURE
+    config = None
+    with ResultStore(output) as store:
+        for ibin, shard in queue.records():
+            shard_config = shard.metadata('config')
+            if config is None:
+                config = shard_config
+                store.append('config', None, config)
+            elif shard_config != config:
+                report(
+                    'error',
+                    f'Bin {ibin} was fit with a different configuration!',
+                    bin=ibin,
+                    kind='config',
+                )
+                return EXIT_FAILURE
+            for key, record_bin, data in shard.records():
+                if record_bin != ibin:
+                    continue
+                if isinstance(data, StoredChain):
+                    # the shard's chains were moved along with it by `complete`
+                    data = replace(
+                        data,
+                        directory=shard.path.with_suffix('.chains') / data.directory.name,
+                    ).copy_to(output.with_suffix('.chains') / f'bin_{ibin:05d}')
+                store.append(key, record_bin, data)
+        results = store.load()
+    if 'scan_result' in results:
+        try:
+            fit_data, _ = configure(description['config'], Path(description['base']))
+        except ConfigError as e:
+            report('error', f'Configuration error: {e}', error=str(e), kind='config')
+            return EXIT_CONFIG
+        fit_data.output_path = output
+        write_scan(fit_data, results['scan_result'], report)
+    columnar = output.with_suffix('.zlmcol')
+    write_columnar(
+        columnar,
+        results,
+        parameters=parameter_names(config) if config is not None else None,
+        config=config,
+    )
+    report(
+        'done',
+        f'Results written to {output} and {columnar}',
+        output=str(output),
+        columnar=str(columnar),
+    )
+    return EXIT_SUCCESS
+
+
+def status(directory: Path, report: Reporter) -> int:
+    queue = WorkQueue(directory)
+    try:
+        bins = queue.bins()
+        queue.description()
+    except ConfigError as e:
+        report('error', f'Configuration error: {e}', error=str(e), kind='config')
+        return EXIT_CONFIG
+    pending = queue.pending()
+    running = [ibin for ibin in pending if queue.lock_path(ibin).exists()]
+    report(
+        'status',
+        f'{len(bins) - len(pending)}/{len(bins)} bins complete, {len(running)} running',
+        complete=len(bins) - len(pending),
+        running=running,
+        waiting=[ibin for ibin in pending if ibin not in running],
+    )
+    return EXIT_SUCCESS
@@ -0,0 +1,64 @@
+import numpy as np
+
+START_METHODS = ('uniform', 'lhs', 'halton', 'sobol')
+
+
+def latin_hypercube(n: int, d: int, rng: np.random.Generator) -> np.ndarray:
+    strata = np.argsort(rng.random((d, n)), axis=1).T
+    return (strata + rng.random((n, d))) / n
+
+
+def _primes(count: int) -> list[int]:
+    primes: list[int] = []
+    candidate = 2
+    while len(primes) < count:
+        if all(candidate % p for p in primes if p * p <= candidate):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+def halton(n: int, d: int, rng: np.random.Generator) -> np.ndarray:
+    # randomized by a uniform shift modulo 1 (Cranley-Patterson rotation)
+    points = np.empty((n, d))
+    for j, base in enumerate(_primes(d)):
+        index = np.arange(1, n + 1)
+        value = np.zeros(n)
+        scale = 1.0 / base
+        while np.any(index > 0):
+            value += (index % base) * scale
+            index //= base
+            scale /= base
+        points[:, j] = value
+    return (points + rng.random(d)) % 1.0
+
+
+def sobol(n: int, d: int, rng: np.random.Generator) -> np.ndarray:
+    try:
+        from scipy.stats import qmc
+    except ImportError as e:
+        raise ImportError('Sobol start points require scipy to be installed!') from e
+    return qmc.Sobol(d, scramble=True, seed=rng).random(n)
+
+
+def sobol_available() -> bool:
+    try:
+        from scipy.stats import qmc  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def unit_points(method: str, n: int, d: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Draws ``n`` points spread over the unit hypercube in ``d`` dimensions.
+    """
+    if method == 'uniform':
+        return rng.random((n, d))
+    if method == 'lhs':
+        return latin_hypercube(n, d, rng)
+    if method == 'halton':
+        return halton(n, d, rng)
+    if method == 'sobol':
+        return sobol(n, d, rng)
+    raise ValueError(f'Unknown start point method {method!r}!')
@@ -0,0 +1,130 @@
+import os
+import pickle
+import struct
+import time
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+MAGIC = b'ZLMFIT\x00\x01'
+RECORD_HEADER = struct.Struct('<II')  # payload length, CRC32 of payload
+
+type Record = tuple[str, int | None, Any]
+
+
+class ResultStore:
+    """
+    Append-only log of per-bin results.
+
+    Every record is a length- and CRC-prefixed pickle of ``(key, ibin, data)`` written
+    with a single ``write`` call, so a crash can at worst leave one torn record at the
+    end of the file, which readers ignore and the next writer truncates. Existing
+    records are never rewritten; if a bin is recorded twice, the first record wins.
+    Writes are flushed immediately and fsynced in batches of ``fsync_every`` records or
+    every ``fsync_interval`` seconds, whichever comes first.
+    """
+
+    def __init__(self, path: Path, *, fsync_every: int = 16, fsync_interval: float = 5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def __enter__(self) -> 'ResultStore':
+        self.open()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def open(self):
+        if self._file is not None:
+            return
+        valid_length = self._scan()[1] if self.path.exists() else 0
+        self._file = self.path.open('r+b' if self.path.exists() else 'wb')
+        if valid_length == 0:
+            self._file.truncate(0)
+            self._file.write(MAGIC)
+            valid_length = len(MAGIC)
+        else:
+            self._file.truncate(valid_length)
+        self._file.seek(valid_length)
+        self.sync()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._file = None
+
+    def sync(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, key: str, ibin: int | None, data: Any):
+        if self._file is None:
+            raise RuntimeError(f'Result store {self.path} is not open!')
+        payload = pickle.dumps((key, ibin, data), protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        self._pending += 1
+        if (
+            self._pending >= self.fsync_every
+            or time.monotonic() - self._last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def _scan(self) -> tuple[list[Record], int]:
+        records = []
+        with self.path.open('rb') as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                if MAGIC.startswith(magic):
+                    return [], 0
+                raise ValueError(f'{self.path} is not a zlmfit result file!')
+            valid_length = f.tell()
+            while header := f.read(RECORD_HEADER.size):
+                if len(header) < RECORD_HEADER.size:
+                    break
+                length, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                records.append(pickle.loads(payload))
+                valid_length = f.tell()
+        return records, valid_length
+
+    def records(self) -> Iterator[Record]:
+        if self._file is not None:
+            self._file.flush()
+        if not self.path.exists():
+            return iter(())
+        return iter(self._scan()[0])
+
+    def results(self, key: str) -> dict[int, Any]:
+        out = {}
+        for record_key, ibin, data in self.records():
+            if record_key == key and ibin is not None and ibin not in out:
+                out[ibin] = data
+        return out
+
+    def metadata(self, key: str) -> Any | None:
+        for record_key, ibin, data in self.records():
+            if record_key == key and ibin is None:
+                return data
+        return None
+
+    def load(self) -> dict[str, dict[int, Any]]:
+        out: dict[str, dict[int, Any]] = {}
+        for key, ibin, data in self.records():
+            if ibin is not None:
+                out.setdefault(key, {}).setdefault(ibin, data)
+        return out
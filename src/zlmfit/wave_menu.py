@@ -208,8 +208,10 @@ class WaveMenu(Screen):
             assert neg_anchor_button is not None and neg_anchor_button.id is not None
             neg_anchor_wave = Wave.from_id(neg_anchor_button.id)
             neg_anchor_index = neg_waves.index(neg_anchor_wave)
-        self.fit_data.pos_waves = pos_waves if pos_waves else None
-        self.fit_data.pos_anchor = pos_anchor_index
-        self.fit_data.neg_waves = neg_waves if neg_waves else None
-        self.fit_data.neg_anchor = neg_anchor_index
+        self.fit_data.set_waves(
+            pos_waves if pos_waves else None,
+            pos_anchor_index,
+            neg_waves if neg_waves else None,
+            neg_anchor_index,
+        )
         self.app.push_screen(FitMenu(self.fit_data))
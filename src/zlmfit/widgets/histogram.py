@@ -5,43 +5,47 @@ from textual.widget import Widget
 
 import plotext as plt
 import numpy as np
-import laddu as ld
 from rich.text import Text
 
 
 class Histogram(Widget):
+    """
+    Histogram of a dataset's (mass, weight) columns, as given by `FitData.mass_columns`
+    so the mass of each dataset is only computed once.
+    """
+
     bins: reactive[int] = reactive(20)
     lower: reactive[float] = reactive(1.0)
     upper: reactive[float] = reactive(2.0)
-    data: reactive[ld.Dataset | None] = reactive(None)
 
     def __init__(
         self,
-        data: ld.Dataset,
+        columns: tuple[np.ndarray, np.ndarray] | None = None,
         bins: int = 40,
         lower: float = 1.0,
         upper: float = 2.0,
         **kwargs,
     ):
         super().__init__(**kwargs)
-        self.data = data
-        mass = ld.Mass([2, 3])
-        self.mass = mass.value_on(self.data)
-        self.weights = self.data.weights
+        self.mass: np.ndarray | None = None
+        self.weights: np.ndarray | None = None
+        if columns is not None:
+            self.mass, self.weights = columns
         self.bins = bins
         self.lower = lower
         self.upper = upper
         self.text_width = 100
         self.plot = self.get_plot()
 
-    def watch_data(self, new_data: ld.Dataset | None):
-        if new_data:
-            mass = ld.Mass([2, 3])
-            self.mass = mass.value_on(new_data)
-            self.weights = new_data.weights
-            self.plot = self.get_plot()
+    def show(self, columns: tuple[np.ndarray, np.ndarray] | None):
+        # shown as loading until the dataset is opened
+        self.mass, self.weights = columns if columns is not None else (None, None)
+        self.plot = self.get_plot()
+        self.refresh(layout=True)
 
     def get_plot(self) -> RenderableType:
+        if self.mass is None:
+            return Text('Loading...')
         plt.clf()
         hist, bins = np.histogram(
             self.mass, self.bins, range=(self.lower, self.upper), weights=self.weights